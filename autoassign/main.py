@@ -2,9 +2,10 @@ import logging
 import os
 
 from github import Github
-from github.GithubObject import NotSet
 
 from libs.utils import *
+from libs.github_graphql import GithubGraphQl
+from libs.ticket_actions import assign_reviewers
 
 
 log_level = os.environ.get('INPUT_LOG_LEVEL', 'INFO')
@@ -23,36 +24,8 @@ def main():
         raise Exception("codebeamer_user and codebeamer_password parameters must be set")
 
     g = Github(access_token)
-    pr = getPullRequest(g)
-    codebeamer_teams = getTeams(pr, (codebeamer_user, codebeamer_password))
-
-    github_teams = getOrganization(g).get_teams()
-    github_teams_cache = convert(github_teams)
-
-    logging.info(f"github_teams_cache: {github_teams_cache}")
-
-    reviewer_team_list = []
-    for ct in codebeamer_teams:
-        review_team_name = f"{ct} - Reviewers"
-        if review_team_name in github_teams_cache:
-            reviewer_team_list.append(github_teams_cache[review_team_name])
-
-    # get_review_requests contains 2 list, first for user, second for teams
-    for team_review_request in pr.get_review_requests()[1]:
-        if team_review_request.slug in reviewer_team_list:
-            reviewer_team_list.remove(team_review_request.slug)
-
-    logging.info(f"Following teams are added to the PR asn reviewers: {reviewer_team_list}")
-
-    if reviewer_team_list:
-        logging.info("Create review request")
-        pr.create_review_request(NotSet, reviewer_team_list)
-
-
-def convert(a):
-    it_name = iter(map(lambda e: e.name, a))
-    it_slug = iter(map(lambda e: e.slug, a))
-    return dict(zip(it_name, it_slug))
+    pr = getPullRequest(g, GithubGraphQl(access_token))
+    assign_reviewers(pr, (codebeamer_user, codebeamer_password), TeamResolver(getOrganization(g)))
 
 
 if __name__ == "__main__":
@@ -4,6 +4,8 @@ import os
 from github import Github
 
 from libs.utils import *
+from libs.github_graphql import GithubGraphQl
+from libs.ticket_actions import label_pull_request
 
 
 log_level = os.environ.get('INPUT_LOG_LEVEL', 'INFO')
@@ -20,17 +22,9 @@ def main():
 
     g = Github(access_token)
 
-    pr = getPullRequest(g)
-
-    # Team Labels
-    teams = getTeams(pr, (codebeamer_user, codebeamer_password))
-    for team in teams:
-        pr.add_to_labels(team)
-
-    # Priority Label
-    priority = get_ticket_priority(pr, (codebeamer_user, codebeamer_password))
-    replace_labels(pr, "priority", priority)
+    pr = getPullRequest(g, GithubGraphQl(access_token))
 
+    label_pull_request(pr, (codebeamer_user, codebeamer_password))
 
 if __name__ == "__main__":
     main()
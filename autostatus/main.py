@@ -1,14 +1,23 @@
+import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from github import Github
 
 from libs.utils import *
+from libs.codebeamer import get_codebeamer_client
+from libs.retry import RETRYABLE_STATUSES
 
 
 log_level = os.environ.get('INPUT_LOG_LEVEL', 'INFO')
 logging.basicConfig(format='ACTION: %(message)s', level=log_level)
 
+output_file = os.environ.get('GITHUB_OUTPUT')
+max_workers = int(os.environ.get('INPUT_MAX_WORKERS', 8))
+
+STATUS_FIELD_ID = 7
+
 
 def main():
     status = os.environ.get("INPUT_STATUS")
@@ -26,13 +35,56 @@ def main():
         return
     auth = (codebeamer_user, codebeamer_password)
 
-    trackerItemIds = collectIds(pr)
-    for trackerItemId in trackerItemIds:
-        resolvedStatus = retry(getStatus, 30, 10)(trackerItemId, status, auth)
-        if resolvedStatus:
-            retry(updateStatus, 30, 10)(trackerItemId, resolvedStatus, auth)
+    client = get_codebeamer_client(auth)
+    # Status decides whether a transition is sent, so it is not taken from the cache
+    items = client.get_items(collectIds(pr), fields=('status',), fresh=True)
+
+    # Options are fetched once per tracker before the transitions start,
+    # items without a known tracker fetch their own
+    failed_trackers = set()
+    for key, item in {tracker_key(item): item for item in items.values()}.items():
+        try:
+            retry(client.get_field_options, 30, 10)(item.id, STATUS_FIELD_ID)
+        except Exception as e:
+            logging.warning(f"Status options of tracker {item.tracker_id} cannot be fetched for #{item.id} item. Exception: {e}")
+            failed_trackers.add(key)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        report = list(executor.map(lambda item: transition(item, status, auth, tracker_key(item) not in failed_trackers), items.values()))
+
+    logging.info(f"Status report: {json.dumps(report)}")
+    if output_file:
+        with open(output_file, 'a') as f:
+            print(f"report={json.dumps(report)}", file=f)
+
+
+def tracker_key(item):
+    return item.tracker_id if item.tracker_id is not None else f"item-{item.id}"
+
+
+def transition(item, status, auth, options_fetched=True):
+    current = (item.status or {}).get('name')
+    entry = {'id': item.id, 'from': current, 'to': status}
+    if current == status:
+        entry['result'] = 'unchanged'
+        return entry
+    if not options_fetched:
+        entry['result'] = 'failed'
+        return entry
+
+    try:
+        resolvedStatus = getStatus(item.id, status, auth)
+        if not resolvedStatus:
+            logging.warning(f"Status cannot be resolved for #{item.id} item by '{status}'")
+            entry['result'] = 'unresolved'
+        elif retry(updateStatus, 30, 10)(item.id, resolvedStatus, auth):
+            entry['result'] = 'changed'
         else:
-            logging.warning(f"Status cannot be resolved for #{trackerItemId} item by '{status}'")
+            entry['result'] = 'failed'
+    except Exception as e:
+        logging.warning(f"Ticket({item.id}) status cannot be changed to: {status}. Exception: {e}")
+        entry['result'] = 'failed'
+    return entry
 
 
 def updateStatus(tracker_item_id, status, auth):
@@ -41,36 +93,29 @@ def updateStatus(tracker_item_id, status, auth):
 
     data = {
         "fieldValues": [{
-            "fieldId": 7,
+            "fieldId": STATUS_FIELD_ID,
             "name": "Status",
             "type": "ChoiceFieldValue",
             "values": [{"id": id, "name": name, "type": "ChoiceOptionReference"}]
         }]}
-    updateStatus = f"https://codebeamer.com/cb/api/v3/items/{tracker_item_id}/fields?quietMode=false"
-
-    try:
-        logging.info(f"Fetching information from: {updateStatus}")
-        response = requests.put(url=updateStatus, auth=auth, headers={'accept': 'application/json', 'Content-Type': 'application/json'}, json=data)
-        logging.info(f"Response: {response.text}")
-        if response.status_code == 200:
-            logging.warning(f"Ticket({id}) status has been changed to: {name}")
+    client = get_codebeamer_client(auth)
+    updateStatus = f"{client.url}/api/v3/items/{tracker_item_id}/fields?quietMode=false"
 
-    except Exception as e:
-        logging.warning(
-            f"Ticket({id}) status cannot be changed to: {name}. Exception: {e}"
-        )
+    logging.info(f"Fetching information from: {updateStatus}")
+    response = client.session.put(url=updateStatus, auth=auth, headers={'accept': 'application/json', 'Content-Type': 'application/json'}, json=data)
+    logging.info(f"Response: {response.text}")
+    client.invalidate(tracker_item_id)
+    if response.status_code == 200:
+        logging.warning(f"Ticket({tracker_item_id}) status has been changed to: {name}")
+        return True
+    if response.status_code in RETRYABLE_STATUSES:
+        response.raise_for_status()
+    logging.warning(f"Ticket({tracker_item_id}) status cannot be changed to: {name}")
+    return False
 
 
 def getStatus(id, status, auth):
-    itemStatuses = f"https://codebeamer.com/cb/api/v3/items/{id}/fields/7/options?page=1&pageSize=100"
-    logging.info(f"Fetching information from: {itemStatuses}")
-    response = requests.get(url=itemStatuses, auth=auth, headers={'accept': 'application/json', 'Content-Type': 'application/json'})
-    if response.status_code == 200:
-        for reference in response.json()['references']:
-            if (reference["name"] == status):
-                return {"name": reference["name"], "id": reference["id"]}
-
-    return None
+    return get_codebeamer_client(auth).get_field_options(id, STATUS_FIELD_ID).get(status)
 
 
 if __name__ == "__main__":
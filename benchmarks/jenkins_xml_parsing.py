@@ -0,0 +1,48 @@
+import io
+import sys
+import tracemalloc
+import xml.dom.minidom
+from time import perf_counter
+
+from libs.utils import iter_xml_values
+
+
+def build_queue_payload(items):
+    body = ''.join(
+        f'<item><id>{i}</id><task><url>https://jenkins/job/pr-{i % 50}/</url></task>'
+        f'<action><parameter><name>PR_LINK</name><value>https://github.com/intland/repo/pull/{i}</value></parameter></action></item>'
+        for i in range(items)
+    )
+    return f'<root>{body}</root>'.encode('utf-8')
+
+
+def parse_with_minidom(payload, tag):
+    dom = xml.dom.minidom.parseString(payload)
+    return [element.firstChild.nodeValue for element in dom.getElementsByTagName(tag)]
+
+
+def parse_with_iterparse(payload, tag):
+    return list(iter_xml_values(io.BytesIO(payload), tag))
+
+
+def measure(parse, payload, tag):
+    tracemalloc.start()
+    t0 = perf_counter()
+    values = parse(payload, tag)
+    elapsed = perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(values), elapsed, peak
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    payload = build_queue_payload(items)
+    print(f"Payload: {len(payload) / 1024 / 1024:.1f} MiB, {items} items")
+    for name, parse in (('minidom', parse_with_minidom), ('iterparse', parse_with_iterparse)):
+        count, elapsed, peak = measure(parse, payload, 'id')
+        print(f"{name:>10}: {count} ids, {elapsed * 1000:.0f} ms, peak memory {peak / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
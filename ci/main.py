@@ -5,11 +5,16 @@ from api4jenkins import Jenkins
 from github import Github
 from libs.utils import *
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 output_file = os.environ.get('GITHUB_OUTPUT')
+step_summary_file = os.environ.get('GITHUB_STEP_SUMMARY')
 log_level = os.environ.get('INPUT_LOG_LEVEL', 'INFO')
 logging.basicConfig(format='JENKINS_ACTION: %(message)s', level=log_level)
 
+# GitHub rejects comments longer than 65536 characters
+max_failed_tests_length = 60000
+
 
 def main():
     # Required
@@ -20,13 +25,17 @@ def main():
     username = os.environ.get("INPUT_USERNAME")
     api_token = os.environ.get("INPUT_API_TOKEN")
     parameters = os.environ.get("INPUT_PARAMETERS")
+    jobs = os.environ.get("INPUT_JOBS")
     timeout = int(os.environ.get("INPUT_TIMEOUT"))
     start_timeout = int(os.environ.get("INPUT_START_TIMEOUT"))
     interval = int(os.environ.get("INPUT_INTERVAL"))
+    max_interval = int(os.environ.get("INPUT_MAX_INTERVAL") or interval)
     access_token = os.environ.get("INPUT_ACCESS_TOKEN")
     display_job_name = os.environ.get("INPUT_DISPLAY_JOB_NAME")
     keep_build_for_ever = os.environ.get('INPUT_KEEP_BUILD', 'true')
     job_type_identifier = os.environ.get('INPUT_JOB_TYPE_IDENTIFIER')
+    console_log = os.environ.get('INPUT_CONSOLE_LOG', 'false')
+    console_log_filter = os.environ.get('INPUT_CONSOLE_LOG_FILTER')
 
     # Preset
     job_query_timeout = 600
@@ -48,29 +57,70 @@ def main():
         return
 
     parameters = convertToJson(parameters)
-    if 'NOTIFICATION_EMAIL' in parameters.keys():
-        parameters['NOTIFICATION_EMAIL'] = ','.join(getPRAuthorEmails(pr.url, access_token))
+    # Outputs are named per job whenever the `jobs` input is used, even for a single entry
+    multiple_jobs = bool(jobs)
+    jobs = convertToJobs(jobs, job_name, display_job_name, parameters)
+    if any('NOTIFICATION_EMAIL' in job['parameters'].keys() for job in jobs):
+        emails = ','.join(getPRAuthorEmails(pr.url, access_token))
+        for job in jobs:
+            if 'NOTIFICATION_EMAIL' in job['parameters'].keys():
+                job['parameters']['NOTIFICATION_EMAIL'] = emails
 
     retry(jenkins.connect_to_jenkins, 60, 20)
 
-    logging.info('Start a build.')
-    queue_item = retry(jenkins.build_job, 60, 10)(job_name, parameters)
-    build = retry(jenkins.wait_for_build, start_timeout, interval)(queue_item)
-    public_build_url =  jenkins.get_public_url(build.url)
-    logging.info(f"Build URL: {public_build_url}")
+    logging.info(f'Start {len(jobs)} build(s).')
+    with ThreadPoolExecutor(max_workers=jenkins.max_workers) as executor:
+        futures = [executor.submit(startBuild, jenkins, job, start_timeout, interval) for job in jobs]
+
+    builds = []
+    start_errors = []
+    for job, future in zip(jobs, futures):
+        try:
+            builds.append(future.result())
+        except Exception as e:
+            logging.warning(f"{job['display_job_name']} - Build cannot be started: {e}")
+            builds.append(None)
+            start_errors.append(e)
+
+    # Builds that did start are not left running unattended when another one cannot start
+    if start_errors:
+        report = stopStartedBuilds(jenkins, jobs, builds)
+        if access_token:
+            issue_comment(g, metadata_id, report)
+        raise Exception(f"{len(start_errors)} of {len(jobs)} build(s) cannot be started") from start_errors[0]
 
+    public_build_urls = []
     with open(output_file, "a") as f:
-        f.write(f"build_number={build.number}\n")
-        
+        for job, build in zip(jobs, builds):
+            public_build_urls.append(jenkins.get_public_url(build.url))
+            logging.info(f"Build URL: {public_build_urls[-1]}")
+            if multiple_jobs:
+                f.write(f"build_number_{outputName(job['job_name'])}={build.number}\n")
+            else:
+                f.write(f"build_number={build.number}\n")
+        if multiple_jobs:
+            f.write(f"build_numbers={json.dumps({job['job_name']: build.number for job, build in zip(jobs, builds)})}\n")
+
+    logs_metadata = keepLogsMetadata(jenkins, builds)
     if access_token:
-        issue_comment(g, metadata_id, f'{display_job_name} - Build started [here]({public_build_url})', jenkins.keep_logs_metadata(build))
+        started = '\n'.join(f"{job['display_job_name']} - Build started [here]({public_build_url})" for job, public_build_url in zip(jobs, public_build_urls))
+        issue_comment(g, metadata_id, started, logs_metadata)
 
-    result = retry(wait_for_build, 28800, 120)(build, public_build_url, timeout, interval)
+    consoles = None
+    if console_log.lower() == 'true':
+        consoles = {
+            public_build_url: ConsoleStream(console_log_filter, f"[{job['display_job_name']}] " if multiple_jobs else '')
+            for job, public_build_url in zip(jobs, public_build_urls)
+        }
+
+    statuses = wait_for_builds(jenkins, dict(zip(public_build_urls, builds)), timeout, interval, max_interval, consoles)
+    results = [statuses[public_build_url].result for public_build_url in public_build_urls]
+    failed = [result for result in results if result in ('FAILURE', 'ABORTED')]
 
     if not access_token:
         logging.info("No comment.")
-        if result in ('FAILURE', 'ABORTED'):
-            raise Exception(result)
+        if failed:
+            raise Exception(failed[0])
         return
 
     if keep_build_for_ever.lower() == 'true':
@@ -79,21 +129,89 @@ def main():
         except Exception as e:
             logging.warning(f"Cannot enable keep_this_build_forever parameter for this job: \n {e}")
 
-    body = f'### [{display_job_name} - Build]({public_build_url}) status returned **{result}**.'
+    bodies = []
+    error = None
+    for job, build, public_build_url in zip(jobs, builds, public_build_urls):
+        status = statuses[public_build_url]
+        display_job_name = job['display_job_name']
+        body = f'### [{display_job_name} - Build]({public_build_url}) status returned **{status.result}**.'
+
+        try:
+            duration = status.duration or retry(waitForBuildExecution, job_query_timeout, job_query_interval)(jenkins, build)
+            body += '\n{display_job_name} - Build ran _{build_time}_'.format(display_job_name=display_job_name, build_time=convertMillisToHumanReadable(duration))
+        except Exception as e:
+            logging.info("Error fetching build details")
+            body += "\nError fetching build details"
+            bodies.append(body)
+            error = Exception("Error fetching build details")
+            continue
+
+        bodies.append(f"{body}\n\n{buildResultMessage(jenkins, build, status.test_report, public_build_url, status.result, max_failed_tests_length // len(jobs))}")
+
+    issue_comment(g, metadata_id, '\n\n'.join(bodies), logs_metadata)
+
+    if error:
+        raise error
+    if failed:
+        raise Exception(failed[0])
+
+
+def convertToJobs(jobs, job_name, display_job_name, parameters):
+    if not jobs:
+        return [{'job_name': job_name, 'display_job_name': display_job_name, 'parameters': parameters}]
 
     try:
-        duration = retry(waitForBuildExecution, job_query_timeout, job_query_interval)(build)
-        body += '\n{display_job_name} - Build ran _{build_time}_'.format(display_job_name=display_job_name, build_time=convertMillisToHumanReadable(duration))
-    except Exception as e:
-        logging.info("Error fetching build details")
-        body += "\nError fetching build details"
-        issue_comment(g, metadata_id, body, jenkins.keep_logs_metadata(build))
-        raise Exception("Error fetching build details")
+        jobs = json.loads(jobs)
+    except json.JSONDecodeError as e:
+        raise Exception('`jobs` is not valid JSON.') from e
 
-    issue_comment(g, metadata_id, f"{body}\n\n{buildResultMessage(build.get_test_report(), public_build_url, result)}", jenkins.keep_logs_metadata(build))
+    converted_jobs = []
+    for job in jobs:
+        if 'job_name' not in job:
+            raise Exception(f'`job_name` is missing from job: {job}')
+        job_parameters = dict(parameters)
+        job_parameters.update(job.get('parameters', {}))
+        converted_jobs.append({
+            'job_name': job['job_name'],
+            'display_job_name': job.get('display_job_name', job['job_name']),
+            'parameters': job_parameters
+        })
+    return converted_jobs
 
-    if result in ('FAILURE', 'ABORTED'):
-        raise Exception(result)
+
+def startBuild(jenkins, job, start_timeout, interval):
+    queue_item = retry(jenkins.build_job, 60, 10)(job['job_name'], job['parameters'])
+    return retry(jenkins.wait_for_build, start_timeout, interval)(queue_item, start_timeout)
+
+
+def stopStartedBuilds(jenkins, jobs, builds):
+    lines = []
+    for job, build in zip(jobs, builds):
+        display_job_name = job['display_job_name']
+        if build is None:
+            lines.append(f"{display_job_name} - Build cannot be started")
+            continue
+
+        public_build_url = jenkins.get_public_url(build.url)
+        try:
+            retry(jenkins.stop_build, 60, 10)(build.url)
+            lines.append(f"{display_job_name} - Build [stopped]({public_build_url}), another build cannot be started")
+        except Exception as e:
+            logging.warning(f"Build cannot be stopped: {public_build_url}. {e}")
+            lines.append(f"{display_job_name} - Build [still running]({public_build_url}), it cannot be stopped")
+    logging.info('\n'.join(lines))
+    return '\n'.join(lines)
+
+
+def keepLogsMetadata(jenkins, builds):
+    metadata = []
+    for build in builds:
+        metadata.extend(json.loads(jenkins.keep_logs_metadata(build)))
+    return json.dumps(metadata)
+
+
+def outputName(job_name):
+    return re.sub(r'\W', '_', job_name)
 
 
 def convertToJson(parameters):
@@ -106,48 +224,65 @@ def convertToJson(parameters):
     return {}
 
 
-def buildResultMessage(test_reports, build_url, result):
-    if (result == "FAILURE" or result == "UNSTABLE") and test_reports is None:
+def buildResultMessage(jenkins, build, test_summary, build_url, result, limit=max_failed_tests_length):
+    if (result == "FAILURE" or result == "UNSTABLE") and test_summary is None:
         return "\n**Jenkins job FAILED, please check the run**"
-    elif test_reports is None:
+    elif test_summary is None:
         return ""
     else:
-        result = retry(get_failed_tests, 60, 10)(test_reports, build_url)
-        failed_tests = result if result else ""
+        failed_tests, counts = get_failed_tests(jenkins, build, build_url, limit)
+        test_summary = dict(test_summary, **counts)
 
-        test_reports_json = test_reports.api_json()
-        p = test_reports_json["passCount"]
-        f = test_reports_json["failCount"]
-        s = test_reports_json["skipCount"]
+        p = test_summary["passCount"]
+        f = test_summary["failCount"]
+        s = test_summary["skipCount"]
         return f"\n\n## Test Results:\n**Passed: {p}**\n**Failed: {f}**\n{failed_tests}\n**Skipped: {s}**"
 
 
-def waitForBuildExecution(build):
-    duration = build.api_json()["duration"]
+def waitForBuildExecution(jenkins, build):
+    duration = jenkins.get_build_status(build).duration
     if not duration:
         raise Exception(f'Build has not finished yet. Waiting few seconds.')
 
     return duration
 
 
-def get_failed_tests(test_reports, build_url):
-    failed_tests = ""
+def get_failed_tests(jenkins, build, build_url, limit):
     try:
-        for suite in test_reports.suites:
-            for case in suite.cases:
-                if(case.status == "FAILED" or case.status == "REGRESSION"):
-                    splitted_class_name = case.class_name.split(".")
-                    class_prefix = ".".join(splitted_class_name[0:-1])
-                    class_name = splitted_class_name[-1]
-                    path = urlencode(f"{class_prefix}/{class_name}/{case.name}")
-                    link = f"{build_url}testReport/junit/{path}"
-                    case_name = case.name.replace('[', r'\[').replace(']', r'\]')
-                    failed_tests += f"- [{case.class_name}.{case_name}]({link})\n"
-        return failed_tests
+        report = retry(jenkins.get_failed_test_cases, 60, 10)(build)
     except Exception as e:
-        logging.warning(f"Cannot get link for broken tests: \n {e}")   
-        return failed_tests
-    
+        logging.warning(f"Cannot get link for broken tests: \n {e}")
+        return "", {}
+
+    lines = []
+    for class_name, name, status in report.pop('cases'):
+        splitted_class_name = class_name.split(".")
+        class_prefix = ".".join(splitted_class_name[0:-1])
+        path = urlencode(f"{class_prefix}/{splitted_class_name[-1]}/{name}")
+        link = f"{build_url}testReport/junit/{path}"
+        case_name = name.replace('[', r'\[').replace(']', r'\]')
+        lines.append(f"- [{class_name}.{case_name}]({link})\n")
+
+    failed_tests = []
+    length = 0
+    for line in lines:
+        if length + len(line) > limit:
+            break
+        failed_tests.append(line)
+        length += len(line)
+
+    if len(failed_tests) < len(lines):
+        overflow = len(lines) - len(failed_tests)
+        logging.info(f"{overflow} failed tests do not fit into the comment")
+        if step_summary_file:
+            with open(step_summary_file, "a") as f:
+                f.write(f"## Failed tests of {build_url}\n{''.join(lines)}\n")
+            failed_tests.append(f"- _... and {overflow} more, see the job summary_\n")
+        else:
+            failed_tests.append(f"- _... and {overflow} more, see the [test report]({build_url}testReport)_\n")
+
+    return ''.join(failed_tests), report
+
 def urlencode(url):
     # Specify the characters you want to remain unencoded (e.g., space, etc.)
       encoded_url = urllib.parse.quote(url, safe="[]()/:")
@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
 
-import requests
+import json
 import logging
 import os
+from time import gmtime, strftime, time
 from github import Github
 from libs.utils import *
+from libs.codebeamer import get_codebeamer_client
+from libs.state import state_path
+
+index_file = os.environ.get('INPUT_TAG_INDEX_FILE') or state_path('cypress-tag-index.json')
+refresh_index = os.environ.get('INPUT_REFRESH_TAG_INDEX', 'true').lower() == 'true'
+index_max_age = int(os.environ.get('INPUT_TAG_INDEX_MAX_AGE') or 24 * 3600)
+
+# Largest offset of a time zone from UTC
+TIME_ZONE_MARGIN = 14 * 3600
 
 def main():
     access_token = os.environ.get("INPUT_ACCESS_TOKEN")
@@ -22,50 +32,106 @@ def main():
     g = Github(access_token)
     pr = getPullRequest(g)
 
+    index = CypressTagIndex(index_file)
+    index.load()
+
     # Tags found in reference field
-    tagList = getCypressTags(pr, auth)
+    tagList = getCypressTags(pr, auth, index)
     
     # Always required tags
-    tags_all = "@cpViewsQG, @cpWorkItemsQG, @cpRegProjectReportingQG, @cpReviewHubQG, @cpTestManagementQG"
+    tags = ["@cpViewsQG", "@cpWorkItemsQG", "@cpRegProjectReportingQG", "@cpReviewHubQG", "@cpTestManagementQG"]
     
     # Add tags found in reference field
+    seen = set(tags)
     for tag in tagList:
-        if tag not in tags_all:
-            tags_all += f', {tag}'
+        if tag not in seen:
+            seen.add(tag)
+            tags.append(tag)
+    tags_all = ', '.join(tags)
     
     print(tags_all)
     
     with open(os.environ['GITHUB_OUTPUT'], 'a') as fh:
         print(f'cypressTagList={tags_all}', file=fh)
 
-def getCypressTags(pr, cbAuth):
+    index.save()
+
+def getCypressTags(pr, cbAuth, index):
     ids = collectIds(pr)
     tagList = []
     if not ids:
         return tagList
-    modules = getCustomFieldItems(ids[-1], cbAuth, "Test Automation Module")
-    for module in modules:
-        module_id = module["id"]
-        tags = getCustomFieldItems(module_id, cbAuth, "Cypress tags")
-        for tag in tags:
-            tagList.append(tag["name"])
+
+    # Modules of every referenced ticket are resolved in one pass
+    client = get_codebeamer_client(cbAuth)
+    module_ids = []
+    for item in client.get_items(ids, fields=('customFields',)).values():
+        module_ids.extend(str(module["id"]) for module in item.custom_field("Test Automation Module"))
+
+    for tags in index.get_tags(client, module_ids).values():
+        tagList.extend(tags)
     return tagList
 
-def getCustomFieldItems(id, cbAuth, fieldName):
-    try:
-        items = []
-        getUrl = f"https://codebeamer.com/cb/api/v3/items/{id}"
-        response = requests.get(url=getUrl, auth=cbAuth)
-        print(response)
-        if response.status_code == 200:
-            for customField in response.json()["customFields"]:
-                if customField["name"] == fieldName:
-                    for item in customField["values"]:
-                       items.append(item)
-        return items
-
-    except Exception as e:
-        logging.warning(f"Custom field item information cannot be fetched from: {getUrl}", e)
+class CypressTagIndex:
+    def __init__(self, path, max_age=index_max_age, check_changes=refresh_index):
+        self.path = path
+        self.max_age = max_age
+        self.check_changes = check_changes
+        self.modules = {}
+        self.changed = False
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self.modules = json.load(f)['modules']
+            logging.info(f"Cypress tag index is loaded with {len(self.modules)} modules")
+        except (OSError, ValueError, KeyError):
+            logging.info(f"Cypress tag index is not found at {self.path}")
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump({'modules': self.modules}, f, separators=(',', ':'))
+        except OSError as e:
+            logging.warning(f"Cypress tag index cannot be saved: {e}")
+
+    def _add(self, items, fetched_at):
+        for id, item in items.items():
+            self.modules[id] = {'version': item.version, 'fetched_at': fetched_at, 'tags': [tag["name"] for tag in item.custom_field("Cypress tags")]}
+        self.changed = True
+
+    def _is_expired(self, id, now):
+        return now - self.modules[id].get('fetched_at', 0) > self.max_age
+
+    def _query_changed(self, client, ids, now):
+        # Codebeamer compares modifiedAt in its own time zone, the margin covers any offset
+        since = strftime('%Y-%m-%d %H:%M:%S', gmtime(min(self.modules[id]['fetched_at'] for id in ids) - TIME_ZONE_MARGIN))
+        try:
+            changed = client.query_items(f"item.id IN ({', '.join(ids)}) AND modifiedAt >= '{since}'")
+        except Exception as e:
+            logging.info(f"Changed modules cannot be queried, fetching every module: {e}")
+            changed = client.get_items(ids, fields=('customFields',), fresh=True)
+        logging.info(f"{len(changed)} of {len(ids)} indexed modules changed since {since}")
+        self._add(changed, now)
+        for id in ids:
+            if id not in changed:
+                self.modules[id]['fetched_at'] = now
+
+    def get_tags(self, client, module_ids):
+        module_ids = list(dict.fromkeys(module_ids))
+        now = time()
+        missing = [id for id in module_ids if id not in self.modules or self._is_expired(id, now)]
+        if missing:
+            logging.info(f"Modules missing from the Cypress tag index or expired: {missing}")
+            self._add(client.get_items(missing, fields=('customFields',), fresh=True), now)
+
+        indexed = [id for id in module_ids if id in self.modules and id not in missing]
+        if indexed and self.check_changes:
+            self._query_changed(client, indexed, now)
+        return {id: self.modules[id]['tags'] for id in module_ids if id in self.modules}
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,6 +6,7 @@ import json
 from github import Github
 
 from libs.utils import *
+from libs.github_graphql import GithubGraphQl
 
 log_level = os.environ.get('INPUT_LOG_LEVEL', 'INFO')
 logging.basicConfig(format='JENKINS_ACTION: %(message)s', level=log_level)
@@ -98,11 +99,12 @@ def main():
         raise Exception("Please provide a configuration file.")
     config_file = f"/app/{config_file}"
     github = Github(access_token)
-    pr = getPullRequest(github)
-    logging.info(f"Files updated: {json.dumps([f.filename for f in pr.get_files()])}")
+    get_pull_request_context(github, gql=GithubGraphQl(access_token))
+    filenames = get_pull_request_file_names(github)
+    logging.info(f"Files updated: {json.dumps(filenames)}")
     with open(config_file) as f:
         config = json.loads(f.read())
-    extra_params = get_extra_params(config, [f.filename for f in pr.get_files()])
+    extra_params = get_extra_params(config, filenames)
     base_parameters.update(extra_params)
     logging.info(f"extra_parameters=\'{json.dumps(base_parameters)}\'")
     with open(os.environ.get("GITHUB_OUTPUT"), "a") as f:
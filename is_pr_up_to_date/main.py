@@ -17,13 +17,10 @@ def main():
     gql = GithubGraphQl(access_token)
     pr = getPullRequest(g)
 
-    comment = getCommentById(pr, metadata_id)
-    if comment:
-        try:
-            comment.delete()
-            logging.info("Comment is deleted")
-        except Exception as e:
-            logging.debug(f"Error deleting comment:\n{e}")
+    try:
+        get_comment_store(pr).delete(metadata_id)
+    except Exception as e:
+        logging.debug(f"Error deleting comment:\n{e}")
 
     missing_commits = get_missing_commits_from_upstream(
         github=g,
@@ -0,0 +1,219 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from libs.codebeamer_cache import get_item_store
+from libs.retry import RETRYABLE_STATUSES, RetryPolicy, map_in_context
+from libs.transport import get_session, CODEBEAMER
+
+
+codebeamer_url = os.environ.get('CODEBEAMER_URL', 'https://codebeamer.com/cb')
+bulk_query_enabled = os.environ.get('CODEBEAMER_BULK_QUERY', 'true').lower() == 'true'
+
+# Upper limit of ids in a single cbQL query
+QUERY_CHUNK_SIZE = 100
+
+
+class CodebeamerItem:
+    # Only these fields are kept, items can have large descriptions
+    fields = ('id', 'name', 'version', 'tracker', 'status', 'priority', 'teams', 'customFields')
+
+    def __init__(self, data):
+        self.data = {field: data[field] for field in self.fields if field in data}
+        self.id = str(data['id'])
+        self.name = data.get('name')
+        self.version = data.get('version')
+        self.tracker_id = (data.get('tracker') or {}).get('id')
+        self.status = data.get('status')
+        self.priority = data.get('priority')
+        self.teams = [team['name'] for team in data.get('teams') or []]
+        self.custom_fields = {field['name']: field.get('values') or [] for field in data.get('customFields') or [] if 'name' in field}
+
+    def custom_field(self, name):
+        return self.custom_fields.get(name, [])
+
+    def __repr__(self):
+        return f'CodebeamerItem(id={self.id}, name={self.name}, teams={self.teams})'
+
+
+class CodebeamerClient:
+    def __init__(self, auth, url=codebeamer_url, max_workers=8, bulk_query=bulk_query_enabled, store=None):
+        self.auth = auth
+        self.url = url
+        self.max_workers = max_workers
+        self.bulk_query = bulk_query
+        self.store = store
+        self.session = get_session(CODEBEAMER)
+        self.failures = {}
+        self._items = {}
+        self._pending = {}
+        self._options = {}
+        self._lock = threading.Lock()
+
+    def _claim(self, ids):
+        claimed = {}
+        waiting = []
+        with self._lock:
+            for id in ids:
+                if id in self._items:
+                    continue
+                if id in self._pending:
+                    waiting.append(self._pending[id])
+                else:
+                    claimed[id] = self._pending[id] = Future()
+                    self.failures.pop(id, None)
+        return claimed, waiting
+
+    def _settle(self, id, item=None, error=None, cached=False):
+        if item and self.store and not cached:
+            self.store.put(id, item.data)
+        with self._lock:
+            future = self._pending.pop(id)
+            if error is None:
+                self._items[id] = item
+            else:
+                # Failures are not memoized, a later lookup tries again
+                self.failures[id] = str(error)
+        future.set_result(item)
+
+    def _fetch_item(self, id):
+        url = f"{self.url}/api/v3/items/{id}"
+        logging.info(f"Fetching information from: {url}")
+        response = self.session.get(url=url, auth=self.auth)
+        if response.status_code == 200:
+            return CodebeamerItem(response.json())
+        if response.status_code in RETRYABLE_STATUSES:
+            response.raise_for_status()
+        logging.info(f"#{id} cannot be resolved to ticket, maybe it is a PR")
+        return None
+
+    def _fetch_concurrently(self, ids):
+        def fetch(id):
+            try:
+                self._settle(id, RetryPolicy(30, 5, name='codebeamer item')(self._fetch_item)(id))
+            except Exception as e:
+                logging.warning(f"Item information cannot be fetched for #{id}: {e}")
+                self._settle(id, error=e)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            map_in_context(executor, fetch, ids)
+
+    def query_items(self, query_string, page_size=QUERY_CHUNK_SIZE):
+        items = {}
+        page = 1
+        while True:
+            response = self.session.post(
+                url=f"{self.url}/api/v3/items/query",
+                auth=self.auth,
+                json={'page': page, 'pageSize': page_size, 'queryString': query_string}
+            )
+            response.raise_for_status()
+            data = response.json()
+            for item in data.get('items') or []:
+                items[str(item['id'])] = CodebeamerItem(item)
+            if not data.get('items') or page * page_size >= data.get('total', 0):
+                return items
+            page += 1
+
+    def _query_items(self, ids):
+        return self.query_items(f"item.id IN ({', '.join(ids)})")
+
+    def _fetch_with_query(self, ids):
+        for i in range(0, len(ids), QUERY_CHUNK_SIZE):
+            chunk = ids[i:i + QUERY_CHUNK_SIZE]
+            try:
+                items = RetryPolicy(30, 5, name='codebeamer query')(self._query_items)(chunk)
+            except Exception as e:
+                logging.info(f"Items cannot be queried in bulk, fetching them one by one: {e}")
+                self._fetch_concurrently(chunk)
+                continue
+
+            logging.info(f"{len(items)} of {len(chunk)} items are resolved with one query")
+            for id in chunk:
+                self._settle(id, items.get(id))
+
+    def _load_cached(self, ids, fields):
+        missing = []
+        for id in ids:
+            data = self.store.get(id, fields)
+            if data:
+                self._settle(id, CodebeamerItem(data), cached=True)
+            else:
+                missing.append(id)
+        return missing
+
+    def get_items(self, ids, fields=CodebeamerItem.fields, fresh=False):
+        ids = list(dict.fromkeys(str(id) for id in ids))
+        if fresh:
+            # Callers deciding on a write must not act on a remembered value
+            with self._lock:
+                for id in ids:
+                    self._items.pop(id, None)
+        futures, waiting = self._claim(ids)
+        claimed = list(futures)
+        try:
+            if self.store and not fresh:
+                claimed = self._load_cached(claimed, fields)
+            if self.bulk_query and len(claimed) > 1:
+                self._fetch_with_query(claimed)
+            else:
+                self._fetch_concurrently(claimed)
+        finally:
+            # Never leave other threads waiting for an id that was not settled,
+            # an id settled here may already be claimed again by another lookup
+            for id, future in futures.items():
+                if self._pending.get(id) is future:
+                    self._settle(id, error=Exception('Lookup is interrupted'))
+
+        for future in waiting:
+            future.result()
+        return {id: self._items[id] for id in ids if self._items.get(id)}
+
+    def get_item(self, id, fields=CodebeamerItem.fields):
+        return self.get_items([id], fields).get(str(id))
+
+    def get_field_options(self, item_id, field_id, page_size=100):
+        # Options are shared by the items of a tracker
+        item = self.get_item(item_id)
+        key = (item.tracker_id if item and item.tracker_id else f"item-{item_id}", field_id)
+        with self._lock:
+            if key in self._options:
+                return self._options[key]
+
+        options = {}
+        page = 1
+        while True:
+            url = f"{self.url}/api/v3/items/{item_id}/fields/{field_id}/options"
+            logging.info(f"Fetching information from: {url}?page={page}")
+            response = self.session.get(url=url, auth=self.auth, params={'page': page, 'pageSize': page_size}, headers={'accept': 'application/json'})
+            response.raise_for_status()
+            data = response.json()
+            references = data.get('references') or []
+            for reference in references:
+                options[reference['name']] = {'id': reference['id'], 'name': reference['name']}
+            if not references or page * page_size >= data.get('total', 0):
+                break
+            page += 1
+
+        with self._lock:
+            self._options[key] = options
+        return options
+
+    def invalidate(self, id):
+        id = str(id)
+        with self._lock:
+            self._items.pop(id, None)
+        if self.store:
+            self.store.invalidate(id)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_codebeamer_client(auth):
+    with _clients_lock:
+        if auth not in _clients:
+            _clients[auth] = CodebeamerClient(auth, store=get_item_store())
+        return _clients[auth]
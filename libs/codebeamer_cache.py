@@ -0,0 +1,119 @@
+import atexit
+import json
+import logging
+import os
+import threading
+from time import time
+
+from libs.state import state_path
+
+
+cache_dir = os.environ.get('CODEBEAMER_CACHE_DIR') or state_path('codebeamer-cache')
+cache_enabled = os.environ.get('CODEBEAMER_CACHE', 'true').lower() == 'true'
+
+# Seconds a cached field is trusted, teams and modules rarely change, status does all the time
+FIELD_TTLS = {
+    'name': 24 * 3600,
+    'teams': 24 * 3600,
+    'customFields': 24 * 3600,
+    'priority': 3600,
+    'status': 300
+}
+DEFAULT_TTL = 300
+
+
+class CodebeamerItemStore:
+    def __init__(self, directory, ttls=FIELD_TTLS):
+        self.directory = directory
+        self.ttls = ttls
+        self.hits = 0
+        self.misses = 0
+        self._pruned = False
+        self._lock = threading.Lock()
+
+    def _path(self, id):
+        return os.path.join(self.directory, f"{id}.json")
+
+    def _prune(self):
+        # Entries older than the longest TTL are never used again
+        max_age = max(self.ttls.values(), default=DEFAULT_TTL)
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.json') and time() - entry.stat().st_mtime > max_age:
+                    os.remove(entry.path)
+        except OSError:
+            pass
+        self._pruned = True
+
+    def ttl(self, fields):
+        return min((self.ttls.get(field, DEFAULT_TTL) for field in fields), default=DEFAULT_TTL)
+
+    def get(self, id, fields):
+        try:
+            with open(self._path(id), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        fresh = entry is not None and time() - entry['fetched_at'] < self.ttl(fields)
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry['data'] if fresh else None
+
+    def _version(self, id):
+        try:
+            with open(self._path(id), 'r') as f:
+                return json.load(f).get('version')
+        except (OSError, ValueError):
+            return None
+
+    def put(self, id, data):
+        path = self._path(id)
+        with self._lock:
+            # Parallel jobs may write the same item, an older version never replaces a newer one
+            cached_version = self._version(id)
+            if cached_version is not None and data.get('version') is not None and cached_version > data['version']:
+                return
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                if not self._pruned:
+                    self._prune()
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump({'version': data.get('version'), 'fetched_at': time(), 'data': data}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.warning(f"Codebeamer item #{id} cannot be cached: {e}")
+
+    def invalidate(self, id):
+        try:
+            os.remove(self._path(id))
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_item_store():
+    global _store
+    with _store_lock:
+        if _store is None and cache_enabled:
+            _store = CodebeamerItemStore(cache_dir)
+        return _store
+
+
+def log_item_cache_stats():
+    if _store and (_store.hits or _store.misses):
+        logging.info(f"Codebeamer item cache: {_store.stats()}")
+
+
+atexit.register(log_item_cache_stats)
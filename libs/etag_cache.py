@@ -0,0 +1,173 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from libs.state import state_path
+
+
+cache_dir = os.environ.get('GITHUB_ETAG_CACHE_DIR') or state_path('github-etag-cache')
+cache_size = int(os.environ.get('GITHUB_ETAG_CACHE_SIZE', 50 * 1024 * 1024))
+
+# Headers that describe the payload, everything else is taken from the fresh 304 response
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Link')
+
+
+class EtagStore:
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._sizes = None
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{hashlib.sha256(key.encode('utf8')).hexdigest()}.json")
+
+    def _load_sizes(self):
+        if self._sizes is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._sizes = {entry.path: entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.json')}
+        return self._sizes
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, entry):
+        path = self._path(key)
+        data = json.dumps(entry)
+        if len(data) > self.max_size:
+            return
+
+        with self._lock:
+            sizes = self._load_sizes()
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            sizes[path] = len(data)
+            self._evict(sizes)
+
+    def _evict(self, sizes):
+        total = sum(sizes.values())
+        if total <= self.max_size:
+            return
+
+        # Least recently used entries go first, reads touch the file
+        for path in sorted(sizes, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0):
+            if total <= self.max_size:
+                break
+            total -= sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def touch(self, key):
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+class EtagCachingAdapter(HTTPAdapter):
+    def __init__(self, store, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+
+    def _key(self, request):
+        # Different tokens may see different content
+        authorization = hashlib.sha256(request.headers.get('Authorization', '').encode('utf8')).hexdigest()
+        return f"{request.url}|{request.headers.get('Accept', '')}|{authorization}"
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != 'GET' or stream:
+            return super().send(request, stream=stream, **kwargs)
+
+        key = self._key(request)
+        entry = self.store.get(key)
+        if entry:
+            if entry.get('etag'):
+                request.headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request.headers['If-Modified-Since'] = entry['last_modified']
+
+        response = super().send(request, stream=stream, **kwargs)
+        if response.status_code == 304 and entry:
+            self.store.record(True)
+            self.store.touch(key)
+            return self._cached_response(request, response, entry)
+
+        self.store.record(False)
+        if response.status_code == 200 and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            try:
+                body = response.content.decode('utf8')
+            except UnicodeDecodeError:
+                return response
+            self.store.put(key, {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'headers': {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers},
+                'body': body
+            })
+        return response
+
+    def _cached_response(self, request, not_modified, entry):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(not_modified.headers)
+        response.headers.update(entry['headers'])
+        response.headers.pop('Content-Length', None)
+        response._content = entry['body'].encode('utf8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_etag_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EtagStore(cache_dir, cache_size)
+        return _store
+
+
+def etag_cache_stats():
+    return get_etag_store().stats()
+
+
+def log_etag_cache_stats():
+    if _store and (_store.hits or _store.misses):
+        logging.info(f"GitHub conditional request cache: {_store.stats()}")
+
+
+atexit.register(log_etag_cache_stats)
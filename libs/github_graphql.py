@@ -1,4 +1,18 @@
-import requests
+import json
+import logging
+
+from libs.transport import get_session, GITHUB_GRAPHQL
+
+
+PULL_REQUEST_CONNECTIONS = {
+    'commits': "nodes { commit { oid message author { email } } }",
+    'files': "nodes { path additions deletions changeType }",
+    'comments': "nodes { id databaseId body author { login } }",
+    # Comments of a thread are not paged, threads longer than 100 comments are flagged as truncated
+    'reviewThreads': "nodes { id isResolved comments(first: 100) { totalCount nodes { id databaseId body path author { login } } } }",
+    'labels': "nodes { name }",
+    'reviewRequests': "nodes { requestedReviewer { __typename ... on Team { slug name } ... on User { login } } }"
+}
 
 
 class GithubGraphQl:
@@ -8,12 +22,213 @@ class GithubGraphQl:
     def run_query(self, query):
         headers = {"Authorization": f"Bearer {self.token}"}
 
-        request = requests.post('https://api.github.com/graphql', json={'query': query}, headers=headers)
+        request = get_session(GITHUB_GRAPHQL).post(
+            'https://api.github.com/graphql',
+            json={'query': query},
+            headers=headers,
+            write=query.lstrip().startswith('mutation')
+        )
         if request.status_code == 200:
             return request.json()
         else:
             raise Exception("Failed to run query. Return code: {}.\n{}".format(request.status_code, query))
 
+    def _connection_query(self, name, cursor, page_size):
+        after = f", after: {json.dumps(cursor)}" if cursor else ""
+        return f"""
+                {name}: {name}(first: {page_size}{after}) {{
+                    pageInfo {{ hasNextPage endCursor }}
+                    {PULL_REQUEST_CONNECTIONS[name]}
+                }}"""
+
+    def get_pull_request_snapshot(self, owner, repository_name, pr_number, connections=tuple(PULL_REQUEST_CONNECTIONS), page_size=100):
+        # Only the connections a caller reads are fetched, comments and threads are the heaviest
+        cursors = {name: None for name in connections}
+        nodes = {name: [] for name in connections}
+        pull_request = None
+        requests = 0
+
+        # The first query fetches every field, later ones only the connections that overflowed
+        while pull_request is None or cursors:
+            fields = "id number title body isDraft headRefOid headRefName baseRefName" if pull_request is None else ""
+            selection = "".join(self._connection_query(name, cursor, page_size) for name, cursor in cursors.items())
+            query = f"""
+            {{
+                repository(owner: "{owner}", name: "{repository_name}") {{
+                    pullRequest(number: {pr_number}) {{
+                        {fields}{selection}
+                    }}
+                }}
+            }}
+            """
+            response = self.run_query(query)
+            requests += 1
+            if (errors := response.get("errors")):
+                raise Exception(errors)
+
+            data = response['data']['repository']['pullRequest']
+            pull_request = pull_request or data
+            for name in list(cursors):
+                nodes[name].extend(data[name]['nodes'])
+                page_info = data[name]['pageInfo']
+                if page_info['hasNextPage']:
+                    cursors[name] = page_info['endCursor']
+                else:
+                    del cursors[name]
+
+        logging.info(f"Pull request #{pr_number} snapshot is loaded with {requests} GraphQL requests")
+        return self._compact_snapshot(pull_request, nodes)
+
+    def _compact_snapshot(self, pull_request, nodes):
+        def comment(node):
+            return {
+                'id': node['id'],
+                'database_id': node['databaseId'],
+                'author': (node.get('author') or {}).get('login'),
+                'body': node['body'],
+                'path': node.get('path')
+            }
+
+        def review_requests(nodes):
+            requests = {'users': [], 'teams': []}
+            for node in nodes:
+                reviewer = node.get('requestedReviewer') or {}
+                if reviewer.get('__typename') == 'Team':
+                    requests['teams'].append(reviewer['slug'])
+                elif reviewer.get('__typename') == 'User':
+                    requests['users'].append(reviewer['login'])
+            return requests
+
+        records = {
+            'commits': lambda nodes: [
+                {
+                    'sha': node['commit']['oid'],
+                    'message': node['commit']['message'],
+                    'author_email': (node['commit'].get('author') or {}).get('email')
+                }
+                for node in nodes
+            ],
+            'files': lambda nodes: [
+                {'path': node['path'], 'additions': node['additions'], 'deletions': node['deletions'], 'change_type': node['changeType']}
+                for node in nodes
+            ],
+            'comments': lambda nodes: [comment(node) for node in nodes],
+            'reviewThreads': lambda nodes: [
+                {
+                    'id': node['id'],
+                    'resolved': node['isResolved'],
+                    'comments': [comment(c) for c in node['comments']['nodes']],
+                    'truncated': node['comments']['totalCount'] > len(node['comments']['nodes'])
+                }
+                for node in nodes
+            ],
+            'labels': lambda nodes: [node['name'] for node in nodes],
+            'reviewRequests': review_requests
+        }
+        keys = {'reviewThreads': 'review_threads', 'reviewRequests': 'review_requests'}
+
+        snapshot = {
+            'id': pull_request['id'],
+            'number': pull_request['number'],
+            'title': pull_request['title'],
+            'body': pull_request['body'],
+            'draft': pull_request['isDraft'],
+            'head_sha': pull_request['headRefOid'],
+            'head_ref': pull_request['headRefName'],
+            'base_ref': pull_request['baseRefName']
+        }
+        for name, connection_nodes in nodes.items():
+            snapshot[keys.get(name, name)] = records[name](connection_nodes)
+        return snapshot
+
+    def get_open_pull_requests(self, owner, repository_name, page_size=25, commits_per_pr=100):
+        pull_requests = []
+        cursor = None
+        while True:
+            after = f", after: {json.dumps(cursor)}" if cursor else ""
+            query = f"""
+            {{
+                repository(owner: "{owner}", name: "{repository_name}") {{
+                    pullRequests(states: OPEN, first: {page_size}{after}) {{
+                        pageInfo {{ hasNextPage endCursor }}
+                        nodes {{
+                            number title body isDraft headRefOid
+                            commits(first: {commits_per_pr}) {{
+                                totalCount
+                                nodes {{ commit {{ oid message }} }}
+                            }}
+                        }}
+                    }}
+                }}
+            }}
+            """
+            response = self.run_query(query)
+            if (errors := response.get("errors")):
+                raise Exception(errors)
+
+            connection = response['data']['repository']['pullRequests']
+            for node in connection['nodes']:
+                commits = node['commits']
+                pull_requests.append({
+                    'number': node['number'],
+                    'title': node['title'],
+                    'body': node['body'],
+                    'draft': node['isDraft'],
+                    'head_sha': node['headRefOid'],
+                    'commits': [{'sha': c['commit']['oid'], 'message': c['commit']['message']} for c in commits['nodes']],
+                    # PRs with more commits have to be scanned on their own
+                    'complete': commits['totalCount'] <= len(commits['nodes'])
+                })
+            if not connection['pageInfo']['hasNextPage']:
+                logging.info(f"{len(pull_requests)} open pull requests are loaded")
+                return pull_requests
+            cursor = connection['pageInfo']['endCursor']
+
+    def get_review_comment_ids(self, owner, repository_name, pr_number, author, page_size=100):
+        # GraphQL logins of GitHub Apps have no "[bot]" suffix
+        login = author[:-len('[bot]')] if author.endswith('[bot]') else author
+        comment_ids = []
+        cursor = None
+        while True:
+            after = f", after: {json.dumps(cursor)}" if cursor else ""
+            query = f"""
+            {{
+                repository(owner: "{owner}", name: "{repository_name}") {{
+                    pullRequest(number: {pr_number}) {{
+                        reviews(first: {page_size}, author: {json.dumps(login)}{after}) {{
+                            pageInfo {{ hasNextPage endCursor }}
+                            nodes {{ comments(first: 100) {{ nodes {{ id databaseId }} }} }}
+                        }}
+                    }}
+                }}
+            }}
+            """
+            response = self.run_query(query)
+            if (errors := response.get("errors")):
+                raise Exception(errors)
+
+            reviews = response['data']['repository']['pullRequest']['reviews']
+            for review in reviews['nodes']:
+                comment_ids.extend({'id': node['id'], 'database_id': node['databaseId']} for node in review['comments']['nodes'])
+            if not reviews['pageInfo']['hasNextPage']:
+                return comment_ids
+            cursor = reviews['pageInfo']['endCursor']
+
+    def delete_review_comment(self, comment_id):
+        query = f"""
+        mutation {{
+            deletePullRequestReviewComment(input: {{id: "{comment_id}"}}) {{
+                clientMutationId
+            }}
+        }}
+        """
+        resp = self.run_query(query)
+        if (errors := resp.get("errors")):
+            if all(error.get('type') == 'NOT_FOUND' for error in errors):
+                raise LookupError(f"Review comment {comment_id} is not found")
+            raise Exception(errors)
+        return resp
+
     def get_pullRequest_id(self, owner, repository_name, pr_number):
         query = f"""
         {{
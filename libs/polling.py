@@ -0,0 +1,35 @@
+import random
+
+
+class PollingSchedule:
+    def __init__(self, min_interval, max_interval, expected_duration=None, fraction=0.25):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.expected_duration = expected_duration
+        self.fraction = fraction
+        self.polls = 0
+
+    def next_interval(self, elapsed):
+        self.polls += 1
+        if not self.expected_duration or self.expected_duration <= 0:
+            return self.min_interval
+
+        # Sleep a fixed fraction of the remaining time, so polls are sparse
+        # at the start and get denser towards the expected finish
+        remaining = self.expected_duration - elapsed
+        if remaining <= 0:
+            return self.min_interval
+        return min(self.max_interval, max(self.min_interval, remaining * self.fraction))
+
+
+class Backoff:
+    def __init__(self, initial, maximum, factor=2):
+        self.initial = initial
+        self.maximum = max(maximum, initial)
+        self.factor = factor
+        self.attempts = 0
+
+    def next_interval(self):
+        self.attempts += 1
+        ceiling = min(self.maximum, self.initial * self.factor ** (self.attempts - 1))
+        return random.uniform(ceiling / 2, ceiling)
@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+from time import sleep, time
+
+from libs.retry import is_rate_limited
+
+
+writes_per_minute = int(os.environ.get('GITHUB_WRITES_PER_MINUTE', 80))
+writes_per_hour = int(os.environ.get('GITHUB_WRITES_PER_HOUR', 500))
+
+WRITE_METHODS = ('POST', 'PATCH', 'PUT', 'DELETE')
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time()
+
+    def reserve(self):
+        now = time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Tokens may go negative, later callers then queue up behind earlier ones
+        self.tokens -= 1
+        return max(-self.tokens / self.rate, 0)
+
+
+class RateLimitGovernor:
+    def __init__(self, writes_per_minute, writes_per_hour, min_remaining=50, max_attempts=5):
+        self.minute_bucket = TokenBucket(writes_per_minute / 60, 3)
+        self.hour_bucket = TokenBucket(writes_per_hour / 3600, writes_per_hour)
+        self.min_remaining = min_remaining
+        self.max_attempts = max_attempts
+        self.limits = {}
+        self.blocked_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, method, resource='core', write=None):
+        with self._lock:
+            now = time()
+            wait = max(self.blocked_until - now, 0)
+
+            limit = self.limits.get(resource)
+            if limit:
+                if limit['remaining'] <= 0:
+                    wait = max(wait, limit['reset'] - now + 1)
+                elif limit['remaining'] < self.min_remaining:
+                    # Spread what is left evenly until the window resets
+                    wait = max(wait, (limit['reset'] - now) / limit['remaining'])
+                limit['remaining'] -= 1
+
+            # GraphQL reads are POSTs as well, callers can tell them apart
+            if write is None:
+                write = method.upper() in WRITE_METHODS
+            if write:
+                wait = max(wait, self.minute_bucket.reserve(), self.hour_bucket.reserve())
+
+        if wait > 0:
+            logging.debug(f"GitHub rate limit: waiting {round(wait, 1)} seconds before {method}")
+            sleep(wait)
+
+    def update(self, response, resource='core'):
+        headers = response.headers
+        with self._lock:
+            if 'X-RateLimit-Remaining' in headers and 'X-RateLimit-Reset' in headers:
+                try:
+                    self.limits[headers.get('X-RateLimit-Resource', resource)] = {
+                        'limit': int(headers.get('X-RateLimit-Limit', 0)),
+                        'remaining': int(headers['X-RateLimit-Remaining']),
+                        'reset': float(headers['X-RateLimit-Reset'])
+                    }
+                except ValueError:
+                    pass
+
+            if not is_rate_limited(response.status_code, headers, response.text if response.status_code == 403 else ''):
+                return False
+
+            retry_after = headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                blocked_until = time() + int(retry_after)
+            elif headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset'):
+                blocked_until = float(headers['X-RateLimit-Reset']) + 1
+            else:
+                # GitHub asks to wait at least a minute after hitting a secondary rate limit
+                blocked_until = time() + 60
+            self.blocked_until = max(self.blocked_until, blocked_until)
+            logging.info(f"GitHub rate limit is hit, requests are paused for {round(self.blocked_until - time())} seconds")
+            return True
+
+    def budget(self):
+        with self._lock:
+            return {
+                'limits': {resource: dict(limit) for resource, limit in self.limits.items()},
+                'blocked_for': max(self.blocked_until - time(), 0),
+                'write_tokens_per_minute': max(self.minute_bucket.tokens, 0),
+                'write_tokens_per_hour': max(self.hour_bucket.tokens, 0)
+            }
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_github_governor():
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = RateLimitGovernor(writes_per_minute, writes_per_hour)
+        return _governor
@@ -0,0 +1,171 @@
+import atexit
+import contextvars
+import logging
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from time import sleep, time
+
+import requests
+
+
+_deadline = contextvars.ContextVar('retry_deadline', default=None)
+_stats = {}
+_stats_lock = threading.Lock()
+
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+class RetryError(Exception):
+    pass
+
+
+def _http_details(error):
+    # Walk the exception chain, helpers often re-raise HTTP errors as plain Exceptions
+    while error is not None:
+        response = getattr(error, 'response', None)
+        if response is not None and getattr(response, 'status_code', None) is not None:
+            return response.status_code, response.headers or {}, response.text or ''
+        if isinstance(getattr(error, 'status', None), int):
+            return error.status, getattr(error, 'headers', None) or {}, str(getattr(error, 'data', ''))
+        error = error.__cause__
+    return None, {}, ''
+
+
+def http_status(error):
+    return _http_details(error)[0]
+
+
+def is_rate_limited(status, headers, text=''):
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    return 'Retry-After' in headers or headers.get('X-RateLimit-Remaining') == '0' or 'rate limit' in text.lower()
+
+
+def is_rate_limited_error(error):
+    return is_rate_limited(*_http_details(error))
+
+
+def is_retryable(error):
+    status, headers, text = _http_details(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES or is_rate_limited(status, headers, text)
+
+    # Our own helpers raise plain exceptions for "not ready yet" conditions, any other
+    # error is retried only when it is a connection problem or a timeout
+    while error is not None:
+        if isinstance(error, TRANSIENT_ERRORS):
+            return True
+        if type(error) is not Exception:
+            return False
+        error = error.__cause__
+    return True
+
+
+def retry_after(error):
+    status, headers, text = _http_details(error)
+    if status is None:
+        return None
+
+    value = headers.get('Retry-After')
+    if value:
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(value).timestamp() - time(), 0)
+            except (TypeError, ValueError):
+                pass
+
+    reset = headers.get('X-RateLimit-Reset')
+    if reset and headers.get('X-RateLimit-Remaining') == '0':
+        try:
+            return max(float(reset) - time(), 0) + 1
+        except ValueError:
+            pass
+    return None
+
+
+def map_in_context(executor, func, items):
+    # Worker threads do not inherit context variables, every task runs in a copy of the caller's
+    futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+    return [future.result() for future in futures]
+
+
+def remaining_budget():
+    deadline = _deadline.get()
+    return None if deadline is None else max(deadline - time(), 0)
+
+
+def retry_stats():
+    with _stats_lock:
+        return {name: dict(counters) for name, counters in _stats.items()}
+
+
+def log_retry_stats():
+    for name, counters in retry_stats().items():
+        level = logging.INFO if counters['retries'] or counters['failures'] else logging.DEBUG
+        logging.log(level, f"Retry stats for {name}: {counters}")
+
+
+def _count(name, key):
+    with _stats_lock:
+        counters = _stats.setdefault(name, {'calls': 0, 'attempts': 0, 'retries': 0, 'failures': 0})
+        counters[key] += 1
+
+
+class RetryPolicy:
+    def __init__(self, timeout, interval, max_interval=None, factor=2, jitter=True, retryable=is_retryable, name=None):
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval if max_interval is not None else interval * 4
+        self.factor = factor
+        self.jitter = jitter
+        self.retryable = retryable
+        self.name = name
+
+    def _backoff(self, attempt):
+        wait = min(self.max_interval, self.interval * self.factor ** (attempt - 1))
+        return random.uniform(wait / 2, wait) if self.jitter else wait
+
+    def __call__(self, func):
+        name = self.name or getattr(func, '__qualname__', repr(func))
+
+        def wrapper(*args, **kwargs):
+            # A nested policy never outlives the one it runs in
+            outer_deadline = _deadline.get()
+            deadline = time() + self.timeout
+            if outer_deadline is not None:
+                deadline = min(deadline, outer_deadline)
+            token = _deadline.set(deadline)
+            _count(name, 'calls')
+            try:
+                attempt = 0
+                while True:
+                    attempt += 1
+                    _count(name, 'attempts')
+                    try:
+                        return func(*args, **kwargs)
+                    except Exception as e:
+                        if not self.retryable(e):
+                            _count(name, 'failures')
+                            raise
+
+                        wait = retry_after(e)
+                        wait = self._backoff(attempt) if wait is None else wait
+                        if time() + wait >= deadline:
+                            _count(name, 'failures')
+                            raise RetryError('TIMEOUT') from e
+
+                        _count(name, 'retries')
+                        logging.info(f"Something happened, re-try again in {round(wait)} seconds... {e}")
+                        sleep(wait)
+            finally:
+                _deadline.reset(token)
+        return wrapper
+
+
+atexit.register(log_retry_stats)
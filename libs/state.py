@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+
+# Docker actions only see a few runner directories, /github/home is mounted from
+# $RUNNER_TEMP/_github_home on the runner, so files there outlive the container
+GITHUB_HOME = '/github/home'
+
+
+def state_path(name):
+    base = GITHUB_HOME if os.path.isdir(GITHUB_HOME) else os.environ.get('RUNNER_TEMP') or tempfile.gettempdir()
+    return os.path.join(base, name)
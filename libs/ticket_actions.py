@@ -0,0 +1,107 @@
+import logging
+
+from github.GithubObject import NotSet
+
+from libs.codebeamer import get_codebeamer_client
+from libs.utils import (
+    getTeams,
+    get_ticket_index,
+    get_requested_team_slugs,
+    get_ticket_priority,
+    pull_request_comment,
+    reconcile_labels
+)
+
+
+def getTickets(pr, cbAuth):
+    ids = get_ticket_index(pr).ids(tickets_only=True)
+
+    client = get_codebeamer_client(cbAuth)
+    items = client.get_items(ids, fields=('name', 'teams'))
+
+    tickets = []
+    for i in ids:
+        if i in items:
+            tickets.append(CodebeamerTicket(i, items[i].name, items[i].teams))
+        elif i in client.failures:
+            tickets.append(CodebeamerTicket(i, "", []))
+
+    return sorted(list(set(tickets)))
+
+
+def buildComment(codebeamer_tickets):
+    if len(codebeamer_tickets) == 1:
+        return f"**Ticket:** {buildLine(codebeamer_tickets[0])}"
+
+    body = "**Tickets**\n"
+    for t in codebeamer_tickets:
+        body += f"- {buildLine(t)}\n"
+
+    return body
+
+
+def buildLine(t):
+    body = f"[#{t.id}](https://codebeamer.com/cb/item/{t.id})"
+
+    if t.title:
+        body += f" - {t.title}"
+    else:
+        body += " - N/A"
+
+    if t.teams:
+        body += f" - {', '.join(t.teams)}"
+
+    return body
+
+
+class CodebeamerTicket:
+    def __init__(self, id, title, teams):
+        self.id = id
+        self.title = title
+        self.teams = teams
+
+    def __repr__(self):
+        return f'CodebeamerTicket(id={self.id}, title={self.title}, teams={self.teams})'
+
+    def __lt__(self, other):
+        return self.id < other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __eq__(self, other):
+        if not isinstance(other, CodebeamerTicket):
+            return NotImplemented
+
+        return self.id == other.id
+
+
+def link_tickets(pr, cbAuth):
+    codebeamer_tickets = getTickets(pr, cbAuth)
+    if codebeamer_tickets:
+        pull_request_comment(pr, "ticketlinker", buildComment(codebeamer_tickets))
+    return codebeamer_tickets
+
+
+def label_pull_request(pr, cbAuth):
+    # Team labels and the priority label are applied together
+    teams = getTeams(pr, cbAuth)
+    priority = get_ticket_priority(pr, cbAuth)
+    return reconcile_labels(pr, teams, {"priority": priority})
+
+
+def assign_reviewers(pr, cbAuth, team_resolver):
+    codebeamer_teams = getTeams(pr, cbAuth)
+
+    reviewer_teams = team_resolver.resolve(f"{ct} - Reviewers" for ct in codebeamer_teams)
+    logging.info(f"reviewer_teams: {reviewer_teams}")
+
+    requested_teams = set(get_requested_team_slugs(pr))
+    reviewer_team_list = sorted(set(reviewer_teams.values()) - requested_teams)
+
+    logging.info(f"Following teams are added to the PR asn reviewers: {reviewer_team_list}")
+
+    if reviewer_team_list:
+        logging.info("Create review request")
+        pr.create_review_request(NotSet, reviewer_team_list)
+    return reviewer_team_list
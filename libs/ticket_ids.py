@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import re
+import threading
+
+from libs.state import state_path
+
+
+cache_dir = os.environ.get('TICKET_ID_CACHE_DIR') or state_path('ticket-id-cache')
+
+# Any "#<number>" reference, it can point to a ticket as well as to a PR or an issue
+REFERENCE_PATTERN = re.compile(r'#(\d+)')
+# Tickets are mentioned as standalone "#<number>" words with more than 5 digits
+TICKET_PATTERN = re.compile(r'(?<!\S)#(\d{6,})(?!\S)')
+
+TITLE = 'title'
+BODY = 'body'
+
+
+class TicketIdIndex:
+    def __init__(self, head_sha=None, commits=None):
+        self.head_sha = head_sha
+        self.texts = {}
+        # Commit SHA -> references found in the commit message
+        self.commits = commits or {}
+
+    def _scan(self, text):
+        if not text:
+            return []
+        tickets = {match.start() for match in TICKET_PATTERN.finditer(text)}
+        return [{'id': match.group(1), 'ticket': match.start() in tickets} for match in REFERENCE_PATTERN.finditer(text)]
+
+    def scan_text(self, source, text):
+        self.texts[source] = self._scan(text)
+
+    def scan_commit(self, sha, message):
+        self.commits[sha] = self._scan(message)
+
+    def references(self):
+        for source, references in self.texts.items():
+            for reference in references:
+                yield source, reference
+        for sha, references in self.commits.items():
+            for reference in references:
+                yield sha, reference
+
+    def ids(self, tickets_only=False):
+        ids = {}
+        for source, reference in self.references():
+            if reference['ticket'] or not tickets_only:
+                ids.setdefault(reference['id'], source)
+        return list(ids)
+
+    def sources(self, id):
+        return [source for source, reference in self.references() if reference['id'] == id]
+
+    def to_json(self):
+        return json.dumps({'head_sha': self.head_sha, 'commits': self.commits})
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        return cls(data['head_sha'], data['commits'])
+
+
+class TicketIdStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, repo_name, number):
+        return os.path.join(self.directory, f"{repo_name.replace('/', '_')}_{number}.json")
+
+    def get(self, repo_name, number):
+        try:
+            with open(self._path(repo_name, number), 'r') as f:
+                return TicketIdIndex.from_json(f.read())
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, repo_name, number, index):
+        path = self._path(repo_name, number)
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    f.write(index.to_json())
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.warning(f"Ticket ids cannot be cached: {e}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_ticket_id_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TicketIdStore(cache_dir)
+        return _store
@@ -0,0 +1,145 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from libs.etag_cache import EtagCachingAdapter, get_etag_store
+from libs.rate_limit import get_github_governor
+
+
+GITHUB = 'github'
+GITHUB_GRAPHQL = 'github-graphql'
+JENKINS = 'jenkins'
+CODEBEAMER = 'codebeamer'
+SONAR = 'sonar'
+
+connect_timeout = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10))
+read_timeout = float(os.environ.get('HTTP_READ_TIMEOUT', 120))
+pool_size = int(os.environ.get('HTTP_POOL_SIZE', 10))
+etag_cache_enabled = os.environ.get('GITHUB_ETAG_CACHE', 'true').lower() == 'true'
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+class PooledSession(requests.Session):
+    def __init__(self, timeout, verify=True, adapter=None, governor=None, resource=None):
+        super().__init__()
+        self.timeout = timeout
+        self.verify = verify
+        self.governor = governor
+        self.resource = resource
+        self.headers['Connection'] = 'keep-alive'
+
+        # pool_block keeps the number of open connections per host bounded
+        # when the session is shared between threads
+        adapter = adapter or HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, write=None, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if not self.governor:
+            return super().request(method, url, **kwargs)
+
+        # Rate limited requests are queued by the governor and sent again
+        for _ in range(self.governor.max_attempts):
+            self.governor.acquire(method, self.resource, write)
+            response = super().request(method, url, **kwargs)
+            if not self.governor.update(response, self.resource):
+                break
+        return response
+
+
+def get_session(service, verify=True, timeout=None):
+    with _lock:
+        session = _sessions.get(service)
+        if session is None:
+            adapter = None
+            governor = None
+            if service == GITHUB and etag_cache_enabled:
+                adapter = EtagCachingAdapter(get_etag_store(), pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+            if service in (GITHUB, GITHUB_GRAPHQL):
+                governor = get_github_governor()
+            session = PooledSession(
+                timeout or (connect_timeout, read_timeout),
+                verify=verify,
+                adapter=adapter,
+                governor=governor,
+                resource='graphql' if service == GITHUB_GRAPHQL else 'core'
+            )
+            _sessions[service] = session
+        return session
+
+
+def close_sessions():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class GithubConnectionResponse:
+    def __init__(self, response):
+        self.status = response.status_code
+        self.headers = response.headers
+        self.text = response.text
+
+    def getheaders(self):
+        return self.headers.items()
+
+    def read(self):
+        return self.text
+
+
+class GithubConnection:
+    protocol = 'https'
+    default_port = 443
+
+    # Same constructor as PyGithub's own connection classes
+    def __init__(self, host, port=None, strict=False, timeout=None, retry=None, pool_size=None, **kwargs):
+        self.host = host
+        self.port = port if port else self.default_port
+        self.timeout = timeout
+        self.verify = kwargs.get('verify', True)
+        self.session = get_session(GITHUB)
+
+    def request(self, verb, url, input, headers):
+        self.verb = verb
+        self.url = url
+        self.input = input
+        self.headers = headers
+
+    def getresponse(self):
+        response = self.session.request(
+            self.verb,
+            f"{self.protocol}://{self.host}:{self.port}{self.url}",
+            headers=self.headers,
+            data=self.input,
+            timeout=self.timeout,
+            verify=self.verify,
+            allow_redirects=False
+        )
+        return GithubConnectionResponse(response)
+
+    def close(self):
+        # The session is shared by every connection
+        pass
+
+
+class GithubHttpConnection(GithubConnection):
+    protocol = 'http'
+    default_port = 80
+
+
+def install_github_transport():
+    try:
+        from github.Requester import Requester
+    except ImportError:
+        return False
+
+    if not hasattr(Requester, 'injectConnectionClasses'):
+        return False
+    Requester.injectConnectionClasses(GithubHttpConnection, GithubConnection)
+    return True
@@ -1,45 +1,111 @@
 import json
-import xml.dom.minidom
 import logging
 import os
 import re
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote_plus
+from xml.etree import ElementTree
 from subprocess import run
-from sys import stderr
+from sys import stderr, stdout
 from time import sleep, time
 
 from api4jenkins import Jenkins
 
+from libs.codebeamer import get_codebeamer_client
+from libs.polling import Backoff, PollingSchedule
+from libs.rate_limit import get_github_governor
+from libs.retry import RetryPolicy, http_status, is_rate_limited_error, map_in_context, remaining_budget
+from libs.ticket_ids import BODY, REFERENCE_PATTERN, TITLE, TicketIdIndex, get_ticket_id_store
+from libs.transport import get_session, install_github_transport, GITHUB, JENKINS
+
+
+# PyGithub requests go through the shared, conditional-request caching GitHub session
+install_github_transport()
+
 
 class JenkinsWrapper:
-    def __init__(self, url, auth):
+    def __init__(self, url, auth, max_workers=5):
         self.url = url
+        self.max_workers = max_workers
         self.queue_endpoint = "/queue/api/xml"
         self.auth = auth
         self.jenkins = Jenkins(url, auth=auth)
-
-    def _wait_for_left_item(self, queue_item):
+        self.session = get_session(JENKINS)
+        self.host_rewrites = {'jenkins.rd2.thingworx.io': 'bitbucket-jenkins.rd2.thingworx.io'}
+        self.public_hosts = {private: public for public, private in self.host_rewrites.items()}
+        self._cache = {}
+        self._original_urls = {}
+        self._cache_lock = threading.Lock()
+
+    def _is_left_item(self, queue_item):
         if queue_item._class.endswith('$LeftItem'):
             logging.info('Build is not blocked anymore')
-            return
-        else:
-            logging.info('Waiting for build not to be blocked')
-            raise Exception('Build is currently blocked.')
+            return True
+        logging.info('Waiting for build not to be blocked')
+        return False
 
     def _modify_url(self, object_to_modify):
-        if (object_to_modify.url.split('/')[2] == 'jenkins.rd2.thingworx.io'):
-            object_to_modify.url = object_to_modify.url.replace(
-                'jenkins.rd2.thingworx.io', 'bitbucket-jenkins.rd2.thingworx.io'
-            )
+        host = object_to_modify.url.split('/')[2]
+        if host in self.host_rewrites:
+            object_to_modify.url = object_to_modify.url.replace(f"//{host}/", f"//{self.host_rewrites[host]}/", 1)
         return object_to_modify
 
+    def _resolve(self, key, loader):
+        with self._cache_lock:
+            if key in self._cache:
+                return self._cache[key]
+
+        resolved = loader()
+        if resolved is not None:
+            if hasattr(resolved, 'url'):
+                self._original_urls[key] = resolved.url
+                resolved = self._modify_url(resolved)
+            with self._cache_lock:
+                self._cache[key] = resolved
+        return resolved
+
+    def invalidate(self, kind=None, name=None):
+        with self._cache_lock:
+            for key in list(self._cache):
+                if (kind is None or key[0] == kind) and (name is None or key[1:] == (name,)):
+                    del self._cache[key]
+                    self._original_urls.pop(key, None)
+
+    def get_original_url(self, kind, name):
+        return self._original_urls.get((kind, name))
+
     def get_job(self, name):
-        return self._modify_url(self.jenkins.get_job(name))
+        return self._resolve(('job', name), lambda: self.jenkins.get_job(name))
+
+    def get_build(self, job_name, build_number):
+        return self._resolve(('build', f"{job_name}#{build_number}"), lambda: self.get_job(job_name).get_build(int(build_number)))
+
+    def get_queue_item(self, item_id):
+        return self._resolve(('queue', str(item_id)), lambda: self.jenkins.queue.get(item_id))
+
+    def get_crumb(self):
+        def load_crumb():
+            response = self.session.get(f"{self.url}/crumbIssuer/api/json", auth=self.auth)
+            if response.status_code == 404:
+                return {}
+            response.raise_for_status()
+            crumb = response.json()
+            return {crumb['crumbRequestField']: crumb['crumb']}
+
+        return self._resolve(('crumb',), load_crumb)
+
+    def _post(self, url, **kwargs):
+        response = self.session.post(url, auth=self.auth, headers=self.get_crumb(), **kwargs)
+        if response.status_code == 403:
+            logging.info("Request is rejected, refreshing crumb")
+            self.invalidate('crumb')
+            response = self.session.post(url, auth=self.auth, headers=self.get_crumb(), **kwargs)
+        return response
 
     def get_artifact(self, job_name, build_number, artifact_name):
-        job = self._modify_url(self.jenkins.get_job(job_name))
-        build = self._modify_url(job.get_build(build_number))
+        build = self.get_build(job_name, build_number)
 
         artifacts = build.get_artifacts()
         for artifact in artifacts:
@@ -49,15 +115,13 @@ class JenkinsWrapper:
                 return artifact
 
     def _is_running_or_pending(self, build):
-        return self._modify_url(build).api_json()['result'] is None
+        return self.get_build_status(build).result is None
 
     def get_public_url(self, private_url):
-        public_url = ""
-        if "bitbucket-jenkins.rd2.thingworx.io" in private_url:
-            public_url = private_url.replace('bitbucket-jenkins.rd2.thingworx.io', 'jenkins.rd2.thingworx.io')
-        else:
-            public_url = private_url
-        return public_url
+        for private_host, public_host in self.public_hosts.items():
+            if private_host in private_url:
+                return private_url.replace(private_host, public_host)
+        return private_url
 
     def connect_to_jenkins(self):
         try:
@@ -67,52 +131,101 @@ class JenkinsWrapper:
         except Exception as e:
             raise Exception('Could not connect to Jenkins.') from e
         
-    def stop_running_builds(self, job_url, job_name, pr_url):
-        job              = self.get_job(job_name)
+    def _iter_xml_values(self, endpoint_to_call, tag):
+        with self.session.get(endpoint_to_call, auth=self.auth, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            yield from iter_xml_values(response.raw, tag)
+
+    def _query_xml_values(self, endpoint_to_call, tag):
+        return list(self._iter_xml_values(endpoint_to_call, tag))
+
+    def _has_xml_values(self, endpoint_to_call, tag):
+        return next(self._iter_xml_values(endpoint_to_call, tag), None) is not None
+
+    def _run_concurrently(self, func, items):
+        # Every item is tried, failures are raised afterwards so an outer retry applies
+        def run_safely(item):
+            try:
+                return func(item), None
+            except Exception as e:
+                logging.warning(f"{func.__name__} failed for {item}: {e}")
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = map_in_context(executor, run_safely, items)
+
+        errors = [error for _, error in results if error]
+        if errors:
+            raise Exception(f"{func.__name__} failed for {len(errors)} of {len(results)} items") from errors[0]
+        return [result for result, _ in results]
+
+    def _verify(self, check, description, timeout=60):
+        if remaining_budget() is not None:
+            timeout = min(timeout, remaining_budget())
+        t0 = time()
+        backoff = Backoff(1, 10)
+        while time() - t0 < timeout:
+            try:
+                if check():
+                    logging.info(f"{description}: verified")
+                    return True
+            except Exception as e:
+                logging.info(f"{description}: check failed, {e}")
+            sleep(backoff.next_interval())
+        raise Exception(f"{description}: not verified within {round(timeout)} seconds")
+
+    def stop_running_builds(self, job, pr_url):
         tree_string      = f"tree=builds[result,number,actions[parameters[name,value]]]"
         xpath_string     = f"xpath=//build[not(result)][action[parameter[name[contains(text(),%27PR_LINK%27)]][value[contains(text(),%27{pr_url}%27)]]]]//number&wrapper=root"
-        endpoint_to_call = f"{job_url}api/xml?{tree_string}&{xpath_string}"
+        endpoint_to_call = f"{job.url}api/xml?{tree_string}&{xpath_string}"
         logging.info(f"Endpoint: {endpoint_to_call}")
 
         logging.info("Checking running builds")
-        session = requests.Session()
-        session.auth = self.auth
-        response = session.get(endpoint_to_call)
-
-        logging.info("Parsing running builds response")
-        dom = xml.dom.minidom.parseString(response.text)
-        if dom.getElementsByTagName('number'):
-            for build_number in dom.getElementsByTagName('number'):
-                parsed_build_number = build_number.firstChild.nodeValue
-                logging.info(f"Stopping build: {parsed_build_number}")
-                build_to_stop = job.get_build(parsed_build_number)
-                build_to_stop = self._modify_url(build_to_stop)
-                build_to_stop.stop()
-                sleep(3)
-            return True
-        else:
+        build_numbers = self._query_xml_values(endpoint_to_call, 'number')
+        if not build_numbers:
             logging.info("No running builds for job")
             return False
 
+        def stop_build(build_number):
+            logging.info(f"Stopping build: {build_number}")
+            build_url = f"{job.url}{build_number}/"
+            self.stop_build(build_url)
+            return build_url
+
+        stopped_builds = self._run_concurrently(stop_build, build_numbers)
+        self._verify(
+            lambda: not any(self.get_build_status_by_url(build_url).building for build_url in stopped_builds),
+            f"Builds {build_numbers} are aborted"
+        )
+        return True
+
+    def stop_build(self, build_url):
+        self._post(f"{build_url}stop").raise_for_status()
+
     def remove_from_queue(self, job_original_url, pr_url):
         xpath_string     = f"xpath=//item[action[parameter[name[contains(text(),%27PR_LINK%27)]][value[contains(text(),%27{pr_url}%27)]]]][task[url[contains(text(),%27{job_original_url}%27)]]]//id&wrapper=root"
         endpoint_to_call = f"{self.url}{self.queue_endpoint}?{xpath_string}"
         logging.info(f"Endpoint: {endpoint_to_call}")
 
         logging.info("Checking queued items")
-        session = requests.Session()
-        session.auth = self.auth
-        response = session.get(endpoint_to_call)
-
-        logging.info("Parsing queue endpoint response")
-        dom = xml.dom.minidom.parseString(response.text)
-        if dom.getElementsByTagName('id'):
-            for item_id in dom.getElementsByTagName('id'):
-                parsed_item_id = item_id.firstChild.nodeValue
-                logging.info(f"Removing item: {parsed_item_id} from queue ")
-                q_obj = self.jenkins.queue.get(parsed_item_id)
-                q_obj.cancel()
-                sleep(5)
+        item_ids = self._query_xml_values(endpoint_to_call, 'id')
+        if not item_ids:
+            return
+
+        def cancel_item(item_id):
+            logging.info(f"Removing item: {item_id} from queue ")
+            # Some Jenkins versions answer 404 even after cancelling, the
+            # queue is re-checked below anyway
+            response = self._post(f"{self.url}/queue/cancelItem", params={'id': item_id})
+            if response.status_code != 404:
+                response.raise_for_status()
+
+        self._run_concurrently(cancel_item, item_ids)
+        self._verify(
+            lambda: not self._has_xml_values(endpoint_to_call, 'id'),
+            f"Queue items {item_ids} are removed"
+        )
 
     def is_build_running(self, build):
         if build.api_json()['result'] not in ['UNSTABLE', 'ABORTED', 'SUCCESS', 'FAILURE']:
@@ -121,13 +234,12 @@ class JenkinsWrapper:
 
     def stop_and_remove(self, job_name):
         logging.info(f"Jenkins job name: {job_name}")
-        original_job_url = self.jenkins.get_job(job_name).url
-        modified_job_url = self.get_job(job_name).url
         job = self.get_job(job_name)
         if not job:
             logging.info(f"Job is not found by name: {job_name}")
             return False
-        
+        original_job_url = self.get_original_url('job', job_name)
+
         github_event = getGithubEvent()
         pull_request_url = github_event['pull_request']['_links']['html']['href']
         logging.info(f"PR url is {pull_request_url}")
@@ -135,7 +247,7 @@ class JenkinsWrapper:
         self.remove_from_queue(original_job_url, pull_request_url)
 
         has_build_stopped = False
-        has_build_stopped = self.stop_running_builds(modified_job_url, job_name, pull_request_url)
+        has_build_stopped = self.stop_running_builds(job, pull_request_url)
 
         return has_build_stopped
 
@@ -143,19 +255,146 @@ class JenkinsWrapper:
         job = self.get_job(job_name)
         return job.build(**parameters)
 
-    def wait_for_build(self, queue_item):
-        retry(self._wait_for_left_item, 600, 10)(queue_item)
+    def wait_for_build(self, queue_item, timeout=600):
+        if remaining_budget() is not None:
+            timeout = min(timeout, remaining_budget())
+        t0 = time()
+        backoff = Backoff(2, 60)
+        while not self._is_left_item(queue_item):
+            if time() - t0 >= timeout:
+                raise Exception('Build is currently blocked.')
+            sleep(backoff.next_interval())
+        logging.info(f'Queue item polled {backoff.attempts + 1} times')
+
         build = queue_item.get_build()
-        build = self._modify_url(build)
         if not build:
             raise Exception(f'Build not started yet. Waiting few seconds.')
+        build = self._modify_url(build)
         logging.info(f'Build has been started.')
         return build
     
+    def get_build_status(self, build):
+        return self.get_build_status_by_url(build.url)
+
+    def get_build_status_by_url(self, build_url):
+        response = self.session.get(f"{build_url}api/json", params={'tree': BuildStatus.tree}, auth=self.auth)
+        response.raise_for_status()
+        return BuildStatus(response.json())
+
+    def get_failed_test_cases(self, build):
+        params = {
+            'tree': 'passCount,failCount,skipCount,suites[cases[className,name,status]]',
+            'xpath': "/*/passCount|/*/failCount|/*/skipCount|//case[status='FAILED' or status='REGRESSION']",
+            'wrapper': 'report'
+        }
+        report = {'cases': []}
+        with self.session.get(f"{build.url}testReport/api/xml", params=params, auth=self.auth, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            for element in iter_xml_elements(response.raw, ('passCount', 'failCount', 'skipCount', 'case')):
+                if element.tag == 'case':
+                    report['cases'].append((element.findtext('className'), element.findtext('name'), element.findtext('status')))
+                else:
+                    report[element.tag] = int(element.text)
+        return report
+
+    def stream_console(self, build_url, console):
+        with self.session.get(f"{build_url}logText/progressiveText", params={'start': console.offset}, auth=self.auth, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=console.chunk_size):
+                console.feed(chunk)
+            console.offset = int(response.headers.get('X-Text-Size', console.offset))
+            more_data = response.headers.get('X-More-Data') == 'true'
+
+        if not more_data:
+            console.flush()
+        return more_data
+
+    def get_last_successful_duration(self, build):
+        job_url = build.url.rstrip('/').rsplit('/', 1)[0]
+        response = self.session.get(f"{job_url}/api/json", params={'tree': 'lastSuccessfulBuild[duration]'}, auth=self.auth)
+        response.raise_for_status()
+        last_successful_build = response.json().get('lastSuccessfulBuild')
+        return last_successful_build['duration'] if last_successful_build else None
+
     def keep_logs_metadata(self, build):
-        fullName = self._modify_url(build.get_job()).full_name
-        number = build.api_json()['number']
-        return json.dumps([{"build": {"fullName": fullName, "number": number}, "enabled": True}])
+        def load_metadata():
+            fullName = build.get_job().full_name
+            number = build.api_json()['number']
+            return json.dumps([{"build": {"fullName": fullName, "number": number}, "enabled": True}])
+
+        return self._resolve(('metadata', build.url), load_metadata)
+
+
+def iter_xml_elements(source, tags):
+    context = ElementTree.iterparse(source, events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        if event == 'end' and element.tag in tags:
+            yield element
+            # Matched elements are not needed anymore, keep the tree empty
+            root.clear()
+
+
+def iter_xml_values(source, tag):
+    for element in iter_xml_elements(source, (tag,)):
+        yield element.text
+
+
+class ConsoleStream:
+    def __init__(self, pattern=None, prefix='', output=None, chunk_size=8192, max_line_length=65536):
+        self.pattern = re.compile(pattern) if pattern else None
+        self.prefix = prefix
+        self.output = output or stdout
+        self.chunk_size = chunk_size
+        self.max_line_length = max_line_length
+        self.offset = 0
+        self.pending = b''
+
+    def feed(self, chunk):
+        lines = (self.pending + chunk).split(b'\n')
+        self.pending = lines.pop()
+        if len(self.pending) > self.max_line_length:
+            lines.append(self.pending)
+            self.pending = b''
+        for line in lines:
+            self._write(line)
+
+    def flush(self):
+        if self.pending:
+            self._write(self.pending)
+            self.pending = b''
+
+    def _write(self, line):
+        line = line.decode('utf8', errors='replace').rstrip('\r')
+        if self.pattern and not self.pattern.search(line):
+            return
+        print(f"{self.prefix}{line}", file=self.output, flush=True)
+
+
+class BuildStatus:
+    tree = 'building,result,duration,estimatedDuration,timestamp,actions[_class,failCount,skipCount,totalCount]'
+
+    def __init__(self, data):
+        self.building = data.get('building', True)
+        self.result = data.get('result')
+        self.duration = data.get('duration')
+        self.estimated_duration = data.get('estimatedDuration')
+        self.timestamp = data.get('timestamp')
+        self.test_report = None
+
+        for action in data.get('actions') or []:
+            if action and 'totalCount' in action:
+                fail_count = action.get('failCount', 0)
+                skip_count = action.get('skipCount', 0)
+                self.test_report = {
+                    'passCount': action['totalCount'] - fail_count - skip_count,
+                    'failCount': fail_count,
+                    'skipCount': skip_count
+                }
+
+    def __repr__(self):
+        return f'BuildStatus(building={self.building}, result={self.result}, duration={self.duration})'
 
 
 def wait_for_mergeable_pr(pr, timeout):
@@ -175,61 +414,238 @@ def wait_for_mergeable_pr(pr, timeout):
 #    raise Exception("Pull request is not mergeable")
 
 
-def wait_for_build(build, build_url, timeout, interval):
+def get_expected_duration(jenkins, build, status):
+    if status.estimated_duration and status.estimated_duration > 0:
+        return status.estimated_duration / 1000
+    try:
+        duration = jenkins.get_last_successful_duration(build)
+        return duration / 1000 if duration else None
+    except Exception as e:
+        logging.info(f"Last successful build duration cannot be fetched: {e}")
+        return None
+
+
+def _is_build_finished(build_url, status):
+    if status.building:
+        return False
+    result = status.result
+    if result == 'SUCCESS':
+        logging.info(f'Build successful. {build_url}')
+        return True
+    if result == 'UNSTABLE':
+        logging.info(f'Build unstable. {build_url}')
+        return True
+    if result in ('FAILURE', 'ABORTED'):
+        logging.info(f'Build status returned "{result}".Build has failed ☹️. {build_url}')
+        return True
+    return False
+
+
+def wait_for_builds(jenkins, builds, timeout, interval, max_interval=None, consoles=None):
+    if remaining_budget() is not None:
+        timeout = min(timeout, remaining_budget())
+    # Without a ceiling builds are polled every interval, so an early failure is seen as soon as before
+    max_interval = max_interval or interval
     t0 = time()
-    sleep(interval)
-    while time() - t0 < timeout:
-        try:
-            if not build.building:
-                result = build.result
-                if result == 'SUCCESS':
-                    logging.info(f'Build successful')
-                    return result
-                if result == 'UNSTABLE':
-                    logging.info(f'Build unstable')
-                    return result
-                if result in ('FAILURE', 'ABORTED'):
-                    logging.info(f'Build status returned "{result}".Build has failed ☹️.')
-                    return result
-            logging.info(f'Build not finished yet. Waiting {interval} seconds. {build_url}')
-        finally:
-            sleep(interval)
-    logging.info(f"Build has not finished and timed out. Waited for {timeout} seconds.")
-    return "TIMEOUT"
+    statuses = {}
+    schedules = {}
+    consoles = consoles or {}
+    console_polls = 0
+    status_polls = 0
+    next_polls = {build_url: t0 for build_url in builds}
+    while next_polls and time() - t0 < timeout:
+        for build_url in [build_url for build_url, at in next_polls.items() if at <= time()]:
+            build = builds[build_url]
+
+            # While the console is streamed, the log request itself tells
+            # whether the build is still running, status is only read at the end
+            if build_url in consoles:
+                console_polls += 1
+                try:
+                    if jenkins.stream_console(build.url, consoles[build_url]):
+                        next_polls[build_url] = time() + interval
+                        continue
+                except Exception as e:
+                    logging.info(f"Console log cannot be fetched: {e}")
+
+            status_polls += 1
+            try:
+                status = statuses[build_url] = jenkins.get_build_status(build)
+            except Exception as e:
+                logging.info(f"Build status cannot be fetched, re-try again... {e}")
+                next_polls[build_url] = time() + interval
+                continue
+
+            if _is_build_finished(build_url, status):
+                del next_polls[build_url]
+                continue
+
+            if build_url not in schedules:
+                expected_duration = get_expected_duration(jenkins, build, status)
+                logging.info(f'Expected build duration: {expected_duration} seconds. {build_url}')
+                schedules[build_url] = PollingSchedule(interval, max_interval, expected_duration)
+
+            started_at = status.timestamp / 1000 if status.timestamp else t0
+            wait = interval if build_url in consoles else schedules[build_url].next_interval(time() - started_at)
+            logging.info(f'Build not finished yet. Waiting {round(wait)} seconds. {build_url}')
+            next_polls[build_url] = time() + wait
+
+        if next_polls:
+            sleep(max(min(min(next_polls.values()), t0 + timeout) - time(), 0))
+
+    for build_url in next_polls:
+        logging.info(f"Build has not finished and timed out. Waited for {timeout} seconds. {build_url}")
+        statuses[build_url] = statuses.get(build_url) or BuildStatus({})
+        statuses[build_url].result = "TIMEOUT"
+
+    logging.info(f"Build status polled {status_polls + console_polls} times for {len(builds)} build(s)")
+    return statuses
+
+
+def wait_for_build(jenkins, build, build_url, timeout, interval, max_interval=None, console=None):
+    consoles = {build_url: console} if console else None
+    return wait_for_builds(jenkins, {build_url: build}, timeout, interval, max_interval, consoles)[build_url]
+
+
+class CommentStore:
+    metadata_pattern = re.compile('<!--(.*)-->')
+
+    def __init__(self, pr):
+        self.pr = pr
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _metadata_ids(self, body):
+        for data in self.metadata_pattern.findall(body or ''):
+            if '"id"' not in data:
+                continue
+            try:
+                json_data = json.loads(data)
+            except json.decoder.JSONDecodeError:
+                continue
+            if isinstance(json_data, dict) and 'id' in json_data:
+                yield json_data['id']
+
+    def _load(self):
+        if self._index is None:
+            index = {}
+            for comment in self.pr.as_issue().get_comments():
+                for metadata_id in self._metadata_ids(comment.body):
+                    index.setdefault(metadata_id, comment)
+            logging.info(f"All comments fetched, {len(index)} comments with metadata")
+            self._index = index
+        return self._index
+
+    def get(self, metadata_id):
+        with self._lock:
+            return self._load().get(metadata_id)
+
+    def upsert(self, metadata_id, content):
+        with self._lock:
+            try:
+                comment = self._load().get(metadata_id)
+            except Exception as e:
+                logging.warning(f"Comments by Id cannot be found, {e}")
+                comment = None
+
+            if comment:
+                try:
+                    comment.edit(content)
+                    logging.info(f"Comment is updated by {metadata_id}")
+                    return comment
+                except Exception as e:
+                    if getattr(e, 'status', None) != 404:
+                        raise Exception(f"Comment can not be updated, error code: {getattr(e, 'status', None)}. Message: {e}") from e
+                    logging.info(f'Comment can not be found which is expected somettimes')
+
+            comment = self.pr.create_issue_comment(content)
+            logging.info(f"New comment is created by {metadata_id}")
+            if self._index is not None:
+                self._index[metadata_id] = comment
+            return comment
+
+    def delete(self, metadata_id):
+        with self._lock:
+            comment = self._load().pop(metadata_id, None)
+            if comment:
+                try:
+                    comment.delete()
+                    logging.info(f"Comment is deleted by {metadata_id}")
+                except Exception as e:
+                    if getattr(e, 'status', None) != 404:
+                        raise
+            return comment
+
+    def refresh(self):
+        with self._lock:
+            self._index = None
+
+
+_comment_stores = {}
+
+
+def get_comment_store(pr):
+    key = (pr.base.repo.full_name, pr.number)
+    if key not in _comment_stores:
+        _comment_stores[key] = CommentStore(pr)
+    return _comment_stores[key]
 
 
 def issue_comment(githubApi, metadata_id, content, metadata={}):
-    comment = None
-    pr = getPullRequest(githubApi)
+    pull_request_comment(getPullRequest(githubApi), metadata_id, content, metadata)
 
-    try:
-        logging.info(f"Try to find comment by {metadata_id}...")
-        comment = getCommentById(pr, metadata_id)
-        logging.info(f"Comment is found by {metadata_id}")
-    except Exception as e:
-        logging.warning(f"Comments by Id cannot be found, {e}")
 
+def pull_request_comment(pr, metadata_id, content, metadata={}):
     content += "\n" + createMetadata(metadata_id, metadata)
-    if comment:
-        logging.info("Comment is deleted")
+    get_comment_store(pr).upsert(metadata_id, content)
+
+
+def delete_comments(delete, comments, max_workers=8):
+    report = {'deleted': [], 'missing': [], 'failed': []}
+    lock = threading.Lock()
+
+    def delete_or_skip(comment):
         try:
-            comment.delete()
-            logging.info("New comment is created")
+            delete(comment)
+            return 'deleted'
+        except LookupError:
+            return 'missing'
         except Exception as e:
-            if e.response.status_code == 404:
-                logging.info(f'Comment can not be found which is expected somettimes')
-            else:
-                raise Exception(f"Comment can not be deleted, error code: {e.response.status_code}. Message: {e.response.text}")
+            # Already deleted comments are not an error
+            if http_status(e) == 404:
+                return 'missing'
+            raise
+
+    def delete_comment(comment):
+        try:
+            outcome = retry(delete_or_skip, 120, 5)(comment)
+        except Exception as e:
+            logging.warning(f"Deleting comment {comment} failed: {e}")
+            outcome = 'failed'
+        with lock:
+            report[outcome].append(comment)
 
-    pr.create_issue_comment(content)
+    # Writes are paced by the shared GitHub rate limiter of the session
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        map_in_context(executor, delete_comment, comments)
 
-def delete_review_comments(github_api, user_name):
-    pr = getPullRequest(github_api)
-    comments = pr.get_review_comments()
+    logging.info(f"Comments deleted: {len(report['deleted'])}, already missing: {len(report['missing'])}, failed: {len(report['failed'])}")
+    return report
+
+
+def delete_review_comments(github_api, user_name, gql=None, max_workers=8, timeout=600, interval=10):
     logging.info(f"Deleting review comments for user:  {user_name}")
-    for comment in comments:
-        if comment.user.login == user_name:
-            comment.delete()
+    if gql:
+        context = get_pull_request_context(github_api)
+        owner, repository_name = context.repo_name.split('/')
+        comments = retry(gql.get_review_comment_ids, timeout, interval)(owner, repository_name, context.number, user_name)
+        return delete_comments(gql.delete_review_comment, [comment['id'] for comment in comments], max_workers)
+
+    def list_comments():
+        return [comment for comment in getPullRequest(github_api).get_review_comments() if comment.user.login == user_name]
+
+    comments = retry(list_comments, timeout, interval)()
+    return delete_comments(lambda comment: comment.delete(), comments, max_workers)
 
 def get_review_comments(github_api, user_name, id):
     pr = getPullRequest(github_api)
@@ -277,7 +693,7 @@ def create_review_comment(
             payload['start_side'] = 'RIGHT'
 
     try:
-        r = requests.post(
+        r = get_session(GITHUB).post(
             url=f"{pr_url}/comments",
             headers=headers,
             data=json.dumps(payload)
@@ -288,27 +704,222 @@ def create_review_comment(
         if e.response.status_code == 422:
             logging.info(f'Error code: {e.response.status_code} is expected as of now.')
         else:
-            raise Exception(f"Post request returned {e.response.status_code}. Message: {e.response.text}")
+            raise Exception(f"Post request returned {e.response.status_code}. Message: {e.response.text}") from e
         return False
 
 
+def review_comment_payload(content, path, line, start_line=None):
+    payload = {
+        'body': content,
+        'path': path,
+        'line': line,
+        'side': 'RIGHT'
+    }
+    if start_line:
+        payload['start_line'] = start_line
+        payload['start_side'] = 'RIGHT'
+    return payload
+
+
+def _post_review(pr_url, headers, commit_sha, comments):
+    r = get_session(GITHUB).post(
+        url=f"{pr_url}/reviews",
+        headers=headers,
+        data=json.dumps({'commit_id': commit_sha, 'event': 'COMMENT', 'comments': comments})
+    )
+    if r.status_code != 422:
+        r.raise_for_status()
+    return r
+
+
+def _is_review_unsent(error):
+    # Reviews are not idempotent, only failures where GitHub did not create the review are sent again
+    return isinstance(error, requests.exceptions.ConnectionError) or is_rate_limited_error(error)
+
+
+def _review_chunks(comments, max_comments, max_bytes):
+    chunk = []
+    size = 0
+    for comment in comments:
+        comment_size = len(json.dumps(comment))
+        if chunk and (len(chunk) >= max_comments or size + comment_size > max_bytes):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(comment)
+        size += comment_size
+    if chunk:
+        yield chunk
+
+
+def create_review(
+    pr_url,
+    auth,
+    commit_sha,
+    comments,
+    max_comments=50,
+    max_bytes=256 * 1024,
+    api_version='2022-11-28'
+):
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"Bearer {auth}",
+        "X-GitHub-Api-Version": api_version
+    }
+    submitted = []
+    rejected = []
+
+    def submit(chunk):
+        response = retry(_post_review, 600, 10, retryable=_is_review_unsent, name='github review')(pr_url, headers, commit_sha, chunk)
+        if response.status_code != 422:
+            submitted.extend(chunk)
+            return
+        if len(chunk) == 1:
+            logging.info(f"Review comment on {chunk[0]['path']}:{chunk[0]['line']} is rejected: {response.text}")
+            rejected.extend(chunk)
+            return
+
+        # Find the invalid comments by halving the chunk
+        middle = len(chunk) // 2
+        submit(chunk[:middle])
+        submit(chunk[middle:])
+
+    for chunk in _review_chunks(comments, max_comments, max_bytes):
+        submit(chunk)
+
+    logging.info(f"Review comments submitted: {len(submitted)}, rejected: {len(rejected)}")
+    return submitted, rejected
+
+
 def keep_logs(build, auth, enabled=True):
     return
 
-def getPullRequest(githubApi):
-    github_event = getGithubEvent()
-    pr_repo_name = github_event["pull_request"]["base"]["repo"]["full_name"]
-    pr_number = github_event["number"] if "number" in github_event else github_event["pull_request"]['number']
+class PullRequestContext:
+    def __init__(self, github_api, repo_name, number, gql=None):
+        self.github_api = github_api
+        self.repo_name = repo_name
+        self.number = number
+        self.gql = gql
+        self._cache = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, loader):
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Loaders read other keys, so they run outside the shared lock
+        with key_lock:
+            with self._lock:
+                if key in self._cache:
+                    return self._cache[key]
+            value = loader()
+            with self._lock:
+                self._cache[key] = value
+            return value
+
+    @property
+    def repo(self):
+        return self._get('repo', lambda: self.github_api.get_repo(self.repo_name))
+
+    @property
+    def pr(self):
+        return self._get('pr', lambda: self.repo.get_pull(self.number))
+
+    @property
+    def files(self):
+        return self._get('files', lambda: list(self.pr.get_files()))
+
+    @property
+    def commits(self):
+        return self._get('commits', lambda: list(self.pr.get_commits()))
+
+    @property
+    def labels(self):
+        return self._get('labels', lambda: list(self.pr.get_labels()))
+
+    def snapshot(self, *connections):
+        owner, repository_name = self.repo_name.split('/')
+        return self._get(('snapshot',) + connections, lambda: self.gql.get_pull_request_snapshot(owner, repository_name, self.number, connections))
+
+    # Readers below take their connection from a GraphQL snapshot when a client is attached,
+    # otherwise they page through the REST API
+
+    @property
+    def file_names(self):
+        if self.gql:
+            return [file['path'] for file in self.snapshot('files')['files']]
+        return [file.filename for file in self.files]
+
+    @property
+    def commit_messages(self):
+        if self.gql:
+            return [(commit['sha'], commit['message']) for commit in self.snapshot('commits')['commits']]
+        return [(c.sha, c.commit.message) for c in self.commits]
+
+    @property
+    def label_names(self):
+        if self.gql:
+            return list(self.snapshot('labels')['labels'])
+        return [label.name for label in self.labels]
+
+    @property
+    def requested_team_slugs(self):
+        if self.gql:
+            return list(self.snapshot('reviewRequests')['review_requests']['teams'])
+        # get_review_requests contains 2 list, first for user, second for teams
+        return [team.slug for team in self.pr.get_review_requests()[1]]
+
+    def prime(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+    def refresh(self, *keys):
+        with self._lock:
+            for key in keys or list(self._cache):
+                self._cache.pop(key, None)
+
+
+_pull_request_contexts = {}
+_pull_request_contexts_lock = threading.Lock()
+
+
+def get_pull_request_context(githubApi, repo_name=None, number=None, gql=None):
+    if repo_name is None or number is None:
+        github_event = getGithubEvent()
+        repo_name = github_event["pull_request"]["base"]["repo"]["full_name"]
+        number = github_event["number"] if "number" in github_event else github_event["pull_request"]['number']
+
+    with _pull_request_contexts_lock:
+        key = (repo_name, number)
+        if key not in _pull_request_contexts:
+            _pull_request_contexts[key] = PullRequestContext(githubApi, repo_name, number, gql)
+        context = _pull_request_contexts[key]
+        if gql and not context.gql:
+            context.gql = gql
+        return context
+
+
+def _find_pull_request_context(pr):
+    return _pull_request_contexts.get((pr.base.repo.full_name, pr.number))
 
-    return githubApi.get_repo(pr_repo_name).get_pull(pr_number)
+
+def getPullRequest(githubApi, gql=None):
+    return get_pull_request_context(githubApi, gql=gql).pr
+
+
+_github_events = {}
 
 
 def getGithubEvent():
-    github_event_file = open(os.environ.get("GITHUB_EVENT_PATH"), "r")
-    github_event = json.loads(github_event_file.read())
-    github_event_file.close()
+    github_event_path = os.environ.get("GITHUB_EVENT_PATH")
+    if github_event_path not in _github_events:
+        with open(github_event_path, "r") as github_event_file:
+            _github_events[github_event_path] = json.loads(github_event_file.read())
 
-    return github_event
+    return _github_events[github_event_path]
 
 
 def loadMetadata(id, comment):
@@ -331,15 +942,7 @@ def createMetadata(id, metadata):
 
 
 def getCommentById(pr, id):
-    for comment in getAllComments(pr):
-        for data in re.findall('<!--(.*)-->', comment.body):
-            try:
-                json_data = json.loads(data)
-            except json.decoder.JSONDecodeError:
-                pass
-            else:
-                if json_data['id'] == id:
-                    return comment
+    return get_comment_store(pr).get(id)
 
 
 def getAllComments(pullRequest):
@@ -351,50 +954,88 @@ def getAllComments(pullRequest):
 
 
 def get_pull_request_files(github_api):
-    pr = getPullRequest(github_api)
-    return pr.get_files()
+    return get_pull_request_context(github_api).files
+
+
+def get_pull_request_file_names(github_api):
+    return get_pull_request_context(github_api).file_names
+
+
+def get_pull_request_commit_messages(pr):
+    context = _find_pull_request_context(pr)
+    return context.commit_messages if context else [(c.sha, c.commit.message) for c in pr.get_commits()]
+
+
+def get_requested_team_slugs(pr):
+    context = _find_pull_request_context(pr)
+    # get_review_requests contains 2 list, first for user, second for teams
+    return context.requested_team_slugs if context else [team.slug for team in pr.get_review_requests()[1]]
 
 
 def getOrganization(githubApi):
     return githubApi.get_organization("intland")
 
 
-def getTeams(pr, cbAuth):
-    ids = collectIds(pr)
-    teams = []
-    for i in set(ids):
-        itemGetUrl = f"https://codebeamer.com/cb/api/v3/items/{i}"
+class TeamResolver:
+    def __init__(self, organization):
+        self.organization = organization
+        self._slugs = {}
+        self._index = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def candidate_slugs(name):
+        slug = re.sub(r'[^a-z0-9_]', '-', name.lower()).strip('-')
+        return list(dict.fromkeys([re.sub(r'-+', '-', slug), slug]))
+
+    def _full_index(self):
+        # Team pages are revalidated with ETags by the GitHub session, unchanged pages cost no rate limit
+        with self._lock:
+            if self._index is None:
+                logging.info("Loading every team of the organization")
+                self._index = {team.name: team.slug for team in self.organization.get_teams()}
+            return self._index
+
+    def _lookup(self, name):
+        for slug in self.candidate_slugs(name):
+            try:
+                team = self.organization.get_team_by_slug(slug)
+            except Exception as e:
+                if http_status(e) == 404:
+                    continue
+                raise
+            if team.name == name:
+                return team.slug
+        return self._full_index().get(name)
+
+    def resolve(self, names):
+        resolved = {}
+        for name in names:
+            if name not in self._slugs:
+                self._slugs[name] = self._lookup(name)
+            if self._slugs[name]:
+                resolved[name] = self._slugs[name]
+        return resolved
 
-        try:
-            logging.info(f"Fetching information from: {itemGetUrl}")
-            response = requests.get(url=itemGetUrl, auth=cbAuth)
-            if response.status_code == 200:
-                logging.info(f"Ticket is found")
-                for t in response.json()["teams"]:
-                    team = t["name"]
-                    logging.info(f"'{team}' is added to teams")
-                    teams.append(t["name"])
 
-        except Exception as e:
-            logging.warning(f"Team information cannot be fetched from: {itemGetUrl}", e)
+def getTeams(pr, cbAuth):
+    items = get_codebeamer_client(cbAuth).get_items(collectIds(pr), fields=('teams',))
+    teams = []
+    for item in items.values():
+        logging.info(f"Ticket #{item.id} is found")
+        for team in item.teams:
+            logging.info(f"'{team}' is added to teams")
+            teams.append(team)
 
     return set(teams)
 
 
 def get_ticket_priority(pr, cbAuth):
-    ids = collectIds(pr)
+    items = get_codebeamer_client(cbAuth).get_items(collectIds(pr), fields=('priority',))
     priority = None
-    for id in ids:
-        itemGetUrl = f"https://codebeamer.com/cb/api/v3/items/{id}"
-        try:
-            logging.info(f"Fetching information from: {itemGetUrl}")
-            response = requests.get(url=itemGetUrl, auth=cbAuth)
-            if response.status_code == 200:
-                logging.info(f"Ticket #{id} is found")
-                if not priority or priority.get("id") > response.json()['priority']['id']:
-                    priority = response.json()['priority']
-        except Exception as e:
-            logging.warning(f"Ticket priority information cannot be fetched from: {itemGetUrl}", e)
+    for item in items.values():
+        if item.priority and (not priority or priority.get("id") > item.priority['id']):
+            priority = item.priority
     if priority:
         return priority.get("name")
     return None
@@ -411,34 +1052,74 @@ def get_missing_commits_from_upstream(github, repo_name, dest_user, dest_branch,
     return repository.compare(quote_plus(f'{dest_user}:{dest_branch}'), quote_plus(source_branch)).behind_by
 
 
-def collectIds(pr):
-    ids = []
-    ids.extend(getIds(pr.title))
-    ids.extend(getIds(pr.body))
-    for c in pr.get_commits():
-        ids.extend(getIds(c.commit.message))
+def _scan_new_commits(pr, cached):
+    comparison = pr.base.repo.compare(cached.head_sha, pr.head.sha)
+    # Force pushes and merges from the base branch need a full scan
+    if comparison.status != 'ahead' or comparison.total_commits != len(comparison.commits):
+        return None
+    if any(len(c.parents) > 1 for c in comparison.commits):
+        return None
+
+    index = TicketIdIndex(pr.head.sha, dict(cached.commits))
+    for c in comparison.commits:
+        index.scan_commit(c.sha, c.commit.message)
+    logging.info(f"Ticket ids: {len(comparison.commits)} new commits are scanned since {cached.head_sha}")
+    return index
+
+
+def build_ticket_index(pr, incremental=True):
+    repo_name = pr.base.repo.full_name
+    store = get_ticket_id_store()
+    cached = store.get(repo_name, pr.number)
 
-    return ids
+    index = None
+    if cached and cached.head_sha == pr.head.sha:
+        index = cached
+    elif cached and incremental:
+        try:
+            index = _scan_new_commits(pr, cached)
+        except Exception as e:
+            logging.info(f"Ticket ids cannot be scanned incrementally: {e}")
+
+    if index is None:
+        index = TicketIdIndex(pr.head.sha)
+        for sha, message in get_pull_request_commit_messages(pr):
+            index.scan_commit(sha, message)
+        store.put(repo_name, pr.number, index)
+    elif index is not cached:
+        store.put(repo_name, pr.number, index)
+
+    # Title and body can be edited without a push, they are always scanned
+    index.scan_text(TITLE, pr.title)
+    index.scan_text(BODY, pr.body)
+    logging.info(f"Ticket ids found: {index.ids()}")
+    return index
+
+
+def get_ticket_index(pr):
+    context = _find_pull_request_context(pr)
+    if context:
+        return context._get('ticket_ids', lambda: build_ticket_index(pr))
+    return build_ticket_index(pr)
+
+
+def collectIds(pr):
+    return get_ticket_index(pr).ids()
 
 
 def getIds(text):
     if text:
-        return re.findall(r'#([\d]+)', text)
+        return REFERENCE_PATTERN.findall(text)
     else:
         return []
 
 
-def retry(func, timeout, interval):
-    def wrapper(*args, **kwargs):
-        t0 = time()
-        while time() - t0 < timeout:
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                sleep(interval)
-                logging.info(f"Something happened, re-try again... {e}")
-        raise Exception('TIMEOUT')
-    return wrapper
+def retry(func, timeout, interval, **kwargs):
+    return RetryPolicy(timeout, interval, **kwargs)(func)
+
+
+def get_github_budget():
+    return get_github_governor().budget()
 
 
 def convertMillisToHumanReadable(millis):
@@ -474,7 +1155,7 @@ def find_old_logs(metadata_id, comments):
 
 
 def getPRAuthorEmails(url, auth):
-    resp = requests.get(f"{url}/commits", headers={"Authorization": f"token {auth}"})
+    resp = get_session(GITHUB).get(f"{url}/commits", headers={"Authorization": f"token {auth}"})
     if resp.ok:
         emails = set()
         for commit in json.loads(resp.content):
@@ -503,12 +1184,39 @@ def runs(command, verbose=0):
     return resp
 
 
+def get_pull_request_label_names(pr):
+    context = _find_pull_request_context(pr)
+    return context.label_names if context else [label.name for label in pr.get_labels()]
+
+
+def reconcile_labels(pr, labels=(), prefixed={}):
+    current = set(get_pull_request_label_names(pr))
+    desired = current | set(labels)
+    for prefix, value in prefixed.items():
+        desired = {name for name in desired if not name.startswith(f"{prefix}:")}
+        if value:
+            desired.add(f"{prefix}:{value}")
+
+    to_add = desired - current
+    to_remove = current - desired
+    if not to_add and not to_remove:
+        logging.info("Labels are up to date")
+        return False
+
+    logging.info(f"Labels to add: {sorted(to_add)}, to remove: {sorted(to_remove)}")
+    # A single add or remove call keeps concurrent label changes, anything more is replaced at once
+    if not to_remove:
+        pr.add_to_labels(*sorted(to_add))
+    elif not to_add and len(to_remove) == 1:
+        pr.remove_from_labels(to_remove.pop())
+    else:
+        pr.set_labels(*sorted(desired))
+
+    context = _find_pull_request_context(pr)
+    if context:
+        context.refresh('labels', ('snapshot', 'labels'))
+    return True
+
+
 def replace_labels(pr, prefix, value):
-    for label in pr.get_labels():
-        if re.match(f"{prefix}:.*", label.name):
-            if label.name == f"{prefix}:{value}":
-                return
-            pr.remove_from_labels(label)
-    if not value:
-        return
-    pr.add_to_labels(f"{prefix}:{value}")
+    return reconcile_labels(pr, prefixed={prefix: value})
@@ -5,6 +5,8 @@ import fnmatch
 from pathlib import Path
 from github import Github
 from libs.utils import *
+from libs.github_graphql import GithubGraphQl
+from libs.transport import get_session, SONAR
 import requests
 from urllib3.exceptions import InsecureRequestWarning
 
@@ -12,6 +14,7 @@ requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
 log_level = os.environ.get('INPUT_LOG_LEVEL', 'INFO')
 logging.basicConfig(format='SONAR_ACTION: %(message)s', level=log_level)
 headers = {'User-Agent':'groovy-2.4.4', 'Accept':'application/json'}
+session = get_session(SONAR, verify=False)
 
 # Some DevOps issue, using internal IP
 DNS = {
@@ -32,18 +35,20 @@ def main():
 
     # Preset
     g = Github(access_token)
+    gql = GithubGraphQl(access_token)
+    get_pull_request_context(g, gql=gql)
 
     # Review comments based on Solar result
     logging.info(f'Creating comments on commit: {commit_sha}')
-    retry(delete_review_comments, timeout, interval)(g, 'github-actions[bot]')
+    delete_review_comments(g, 'github-actions[bot]', gql=gql, timeout=timeout, interval=interval)
 
-    mapping = get_component_path_mappings(get_pull_request_files(g))
+    mapping = get_component_path_mappings(get_pull_request_file_names(g))
 
     bugs        = retry(search_in_sonar_issues, timeout, interval)(url, api_token, mapping, commit_sha, 'BUG', 'MAJOR,CRITICAL,BLOCKER', 'true')
     code_smells = retry(search_in_sonar_issues, timeout, interval)(url, api_token, mapping, commit_sha, 'CODE_SMELL', 'CRITICAL,BLOCKER', 'true')
     issues      = bugs + code_smells
 
-    any_comment_submitted = retry(create_comments_from_issues, timeout, interval)(g, access_token, commit_sha, issues)
+    any_comment_submitted = create_comments_from_issues(g, access_token, commit_sha, issues)
     if any_comment_submitted:
         issue_comment(g, "sonar-report", "### Sonar Quality check result\n\n FAILED", keepLogsMetadata(commit_sha))
     else:
@@ -67,7 +72,7 @@ def getSonarStatusMessage(url, original_url, api_token, commit_sha, timeout, int
     return message
 
 def getProjectStatus(url, api_token, projectKey, branch):
-    response = requests.get(f'{url}/api/qualitygates/project_status', params={'projectKey' : projectKey, 'branch' : branch}, auth=(api_token,''), headers=headers, verify=False)
+    response = session.get(f'{url}/api/qualitygates/project_status', params={'projectKey' : projectKey, 'branch' : branch}, auth=(api_token,''), headers=headers)
     if response.status_code == 200:
         return response.json()['projectStatus']['status']
     elif response.status_code == 404:
@@ -95,15 +100,14 @@ def getSonarProjects(url, api_token, timeout, interval):
     return projects
 
 def search(url, page, api_token):
-    return requests.get(f'{url}/api/projects/search', params={'p' : page}, auth=(api_token,''), headers=headers, verify=False)
+    return session.get(f'{url}/api/projects/search', params={'p' : page}, auth=(api_token,''), headers=headers)
 
 def delete_branch(url, api_token, project, branch):
-    return requests.post(
+    return session.post(
         f'{url}/api/project_branches/delete',
         params={'branch': branch, 'project': project},
         auth=(api_token,''),
-        headers=headers,
-        verify=False
+        headers=headers
     )
 
 def keepLogsMetadata(commit_sha):
@@ -114,7 +118,7 @@ def search_in_sonar_issues(url, api_token, mapping, branch, types, severities, i
     issues = []
     for component, path_prefix in mapping.items():
         print(f"Getting issues for {component}")
-        response = requests.get(
+        response = session.get(
             f'{url}/api/issues/search',
             params={
                 'componentKeys': component,
@@ -124,19 +128,18 @@ def search_in_sonar_issues(url, api_token, mapping, branch, types, severities, i
                 'severities': severities
             },
             auth=(api_token,''),
-            headers=headers,
-            verify=False
+            headers=headers
         ).json()
         print(response)
         project_issues = response['issues']
         issues = issues + format_issues(project_issues, path_prefix)
     return issues
 
-def get_component_path_mappings(files):
+def get_component_path_mappings(file_names):
     mapping = {}
-    for file in files:
-        if '/src/' in file.filename:
-            path_prefix = file.filename[:file.filename.index("src")]
+    for file_name in file_names:
+        if '/src/' in file_name:
+            path_prefix = file_name[:file_name.index("src")]
             component   = path_prefix.split('/')[-2]
             if component not in mapping:
                 mapping[component] = path_prefix
@@ -147,28 +150,25 @@ def create_comments_from_issues(github_api, access_token, commit_sha, issues):
 
     pr = getPullRequest(github_api)
 
-    number_of_comments = 0
+    comments = []
     for i, issue in enumerate(issues):
         content = format_content(list(DNS.keys())[0], issue)
         
         if i < 10:
-            is_successful = create_review_comment(
-                pr_url=pr.url,
-                auth=access_token,
-                commit_sha=commit_sha,
+            comments.append(review_comment_payload(
                 content=content,
                 path=issue['file'],
                 line=issue['endLine'],
                 start_line=issue['startLine'] if issue['startLine'] != issue['endLine'] else None
-            )
-            if is_successful:
-                number_of_comments += 1
-            else:
-                logging.info(f'Issue: {content}')
+            ))
         else:
             logging.info(f'Issue: {content}')
 
-    return number_of_comments > 0
+    submitted, rejected = create_review(pr.url, access_token, commit_sha, comments)
+    for comment in rejected:
+        logging.info(f"Issue: {comment['body']}")
+
+    return len(submitted) > 0
 
 def format_issues(issues, path_prefix):
     formatted_issues = []
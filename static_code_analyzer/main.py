@@ -78,8 +78,7 @@ def main():
     access_token = os.environ.get("INPUT_ACCESS_TOKEN")
 
     g = Github(access_token)
-    pr = getPullRequest(g)
-    files = pr.get_files()
+    files = get_pull_request_files(g)
 
     json_data = json.dumps(collectChanges(files))
     json_bytes = json_data.encode('utf-8')
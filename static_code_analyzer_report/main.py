@@ -72,8 +72,10 @@ def main():
         new_violations = get_new_violations(review_comment_cache, violation_cache)
         logging.info(f'new_violations: {new_violations}')
 
-        retry(create_comments_from_issues, timeout, interval)(g, access_token, commit_sha, new_violations)
-        retry(delete_review_comments, timeout, interval)(obsolite_review_comments)
+        create_comments_from_issues(g, access_token, commit_sha, new_violations)
+        report = delete_comments(lambda review_comment: review_comment.delete(), obsolite_review_comments)
+        if report['failed']:
+            logging.warning(f"Obsolete review comments are not deleted: {report['failed']}")
 
         if len(violations) > 0:
             retry(issue_comment, timeout, interval)(g, "static-code-analyzer-violation-report", "### Static Code Analyzer check\n\n FAILED", keepLogsMetadata(commit_sha))
@@ -82,10 +84,6 @@ def main():
     finally:
         deleteDir(extract_directory)
 
-def delete_review_comments(obsolite_review_comments):
-    for review_comment in obsolite_review_comments:
-        review_comment.delete()
-
 def get_new_violations(review_comment_cache, violation_cache):
     review_comment_keys = set(review_comment_cache.keys())
     violation_keys = set(violation_cache.keys())
@@ -136,8 +134,14 @@ def create_comments_from_issues(github_api, access_token, commit_sha, violations
     pr = getPullRequest(github_api)
 
     number_of_comments = 0
+    comments = []
     for violation in violations:
         content = violation.format_content()
+        if not violation.isGlobal:
+            comments.append(review_comment_payload(content=content, path=violation.file, line=violation.lineNumber))
+            continue
+
+        # File level comments are not supported in reviews
         is_successful = retry(create_review_comment, timeout, interval)(
             pr_url=pr.url,
             auth=access_token,
@@ -153,7 +157,11 @@ def create_comments_from_issues(github_api, access_token, commit_sha, violations
         else:
             logging.info(f'Violation: {content}')
 
-    return number_of_comments > 0
+    submitted, rejected = create_review(pr.url, access_token, commit_sha, comments)
+    for comment in rejected:
+        logging.info(f"Violation: {comment['body']}")
+
+    return number_of_comments + len(submitted) > 0
 
 class Violation:
     def __init__(self, message, file, severity, category, lineNumber, isGlobal):
@@ -0,0 +1,130 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import libs.ticket_ids
+import libs.utils
+from libs.ticket_ids import TicketIdStore
+
+
+def commit(sha, message):
+    return SimpleNamespace(sha=sha, commit=SimpleNamespace(message=message), parents=[sha])
+
+
+class FakePullRequest:
+    def __init__(self, repo, number, commits=(), labels=(), files=(), title="", body=None):
+        self.base = SimpleNamespace(repo=repo)
+        self.head = SimpleNamespace(sha=commits[-1].sha if commits else 'head')
+        self.number = number
+        self.title = title
+        self.body = body
+        self.commits = list(commits)
+        self.labels = set(labels)
+        self.files = list(files)
+        self.reads = {'commits': 0, 'labels': 0, 'files': 0, 'review_requests': 0}
+        self.writes = []
+        self._lock = threading.Lock()
+
+    def _read(self, name):
+        with self._lock:
+            self.reads[name] += 1
+
+    def get_commits(self):
+        self._read('commits')
+        return list(self.commits)
+
+    def get_files(self):
+        self._read('files')
+        return list(self.files)
+
+    def get_labels(self):
+        self._read('labels')
+        return [SimpleNamespace(name=name) for name in sorted(self.labels)]
+
+    def get_review_requests(self):
+        self._read('review_requests')
+        return [], []
+
+    def add_to_labels(self, *labels):
+        self.writes.append(('add', labels))
+        self.labels.update(labels)
+
+    def remove_from_labels(self, label):
+        self.writes.append(('remove', label))
+        self.labels.discard(label)
+
+    def set_labels(self, *labels):
+        self.writes.append(('set', labels))
+        self.labels = set(labels)
+
+
+class FakeRepo:
+    def __init__(self, full_name):
+        self.full_name = full_name
+        self.pulls = {}
+        self.pull_reads = 0
+        self._lock = threading.Lock()
+
+    def add_pull(self, number, **kwargs):
+        self.pulls[number] = FakePullRequest(self, number, **kwargs)
+        return self.pulls[number]
+
+    def get_pull(self, number):
+        with self._lock:
+            self.pull_reads += 1
+            if number not in self.pulls:
+                self.pulls[number] = FakePullRequest(self, number)
+            return self.pulls[number]
+
+
+class FakeGithub:
+    def __init__(self, repo):
+        self.repo = repo
+        self.repo_reads = 0
+        self._lock = threading.Lock()
+
+    def get_repo(self, name):
+        with self._lock:
+            self.repo_reads += 1
+        return self.repo
+
+    def get_organization(self, name):
+        return SimpleNamespace(login=name)
+
+
+@pytest.fixture(autouse=True)
+def pull_request_contexts(monkeypatch):
+    # Every test starts without cached pull request contexts
+    monkeypatch.setattr(libs.utils, '_pull_request_contexts', {})
+
+
+@pytest.fixture
+def ticket_id_store(tmp_path, monkeypatch):
+    store = TicketIdStore(str(tmp_path / 'ticket-ids'))
+    monkeypatch.setattr(libs.ticket_ids, '_store', store)
+    return store
+
+
+@pytest.fixture
+def repo():
+    return FakeRepo("test/repo")
+
+
+@pytest.fixture
+def github(repo):
+    return FakeGithub(repo)
+
+
+@pytest.fixture
+def run_with_timeout():
+    # A daemon thread lets a deadlocked call fail the test instead of hanging the run
+    def run(func, timeout=5):
+        result = {}
+        thread = threading.Thread(target=lambda: result.setdefault('value', func()), daemon=True)
+        thread.start()
+        thread.join(timeout)
+        assert not thread.is_alive(), "call is blocked"
+        return result['value']
+
+    return run
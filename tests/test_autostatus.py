@@ -0,0 +1,40 @@
+import importlib.util
+import os
+from types import SimpleNamespace
+
+
+spec = importlib.util.spec_from_file_location('autostatus_main', os.path.join(os.path.dirname(__file__), '..', 'autostatus', 'main.py'))
+autostatus = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(autostatus)
+
+
+def item(id, status, tracker_id=9):
+    return SimpleNamespace(id=id, tracker_id=tracker_id, status={'name': status})
+
+
+def test_item_in_target_status_is_unchanged():
+    entry = autostatus.transition(item('1', 'Done'), 'Done', ('u', 'p'))
+
+    assert entry == {'id': '1', 'from': 'Done', 'to': 'Done', 'result': 'unchanged'}
+
+
+def test_item_without_status_options_is_failed():
+    entry = autostatus.transition(item('1', 'New'), 'Done', ('u', 'p'), options_fetched=False)
+
+    assert entry['result'] == 'failed'
+
+
+def test_items_transition_to_the_resolved_status(monkeypatch):
+    updates = []
+    monkeypatch.setattr(autostatus, 'getStatus', lambda id, status, auth: {'id': 3, 'name': status} if id == '1' else None)
+    monkeypatch.setattr(autostatus, 'updateStatus', lambda id, status, auth: updates.append((id, status['id'])) or True)
+
+    results = [autostatus.transition(item(id, 'New'), 'Done', ('u', 'p'))['result'] for id in ('1', '2')]
+
+    assert results == ['changed', 'unresolved']
+    assert updates == [('1', 3)]
+
+
+def test_items_without_tracker_are_not_grouped():
+    assert autostatus.tracker_key(item('1', 'New', None)) != autostatus.tracker_key(item('2', 'New', None))
+    assert autostatus.tracker_key(item('1', 'New')) == autostatus.tracker_key(item('2', 'New'))
@@ -0,0 +1,39 @@
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import requests
+
+
+spec = importlib.util.spec_from_file_location('ci_main', os.path.join(os.path.dirname(__file__), '..', 'ci', 'main.py'))
+ci = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ci)
+
+
+class FakeJenkins:
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.stopped = []
+
+    def get_public_url(self, url):
+        return url.replace('internal', 'public')
+
+    def stop_build(self, build_url):
+        if build_url in self.failing:
+            raise requests.HTTPError("Stop is rejected", response=SimpleNamespace(status_code=400, headers={}, text=''))
+        self.stopped.append(build_url)
+
+
+def test_started_builds_are_stopped_when_another_cannot_start():
+    jobs = [{'display_job_name': name} for name in ('a', 'b', 'c')]
+    builds = [SimpleNamespace(url='http://internal/a/1/'), None, SimpleNamespace(url='http://internal/c/1/')]
+    jenkins = FakeJenkins(failing=['http://internal/c/1/'])
+
+    report = ci.stopStartedBuilds(jenkins, jobs, builds)
+
+    assert jenkins.stopped == ['http://internal/a/1/']
+    assert report.splitlines() == [
+        "a - Build [stopped](http://public/a/1/), another build cannot be started",
+        "b - Build cannot be started",
+        "c - Build [still running](http://public/c/1/), it cannot be stopped"
+    ]
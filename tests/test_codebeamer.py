@@ -0,0 +1,127 @@
+import json
+import threading
+
+import requests
+
+from libs.codebeamer import CodebeamerClient
+from libs.codebeamer_cache import CodebeamerItemStore
+
+
+def item(id, status='New'):
+    return {'id': int(id), 'name': f"Item {id}", 'version': 1, 'tracker': {'id': 9}, 'status': {'name': status}}
+
+
+def response(status, body):
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(body).encode()
+    return r
+
+
+class FakeSession:
+    def __init__(self, status='New'):
+        self.status = status
+        self.gets = []
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def get(self, url, auth=None, **kwargs):
+        with self._lock:
+            self.gets.append(url)
+        return response(200, item(url.rsplit('/', 1)[1], self.status))
+
+    def post(self, url, auth=None, json=None):
+        with self._lock:
+            self.queries.append(json['queryString'])
+        ids = json['queryString'][len('item.id IN ('):-1].split(', ')
+        return response(200, {'items': [item(id, self.status) for id in ids], 'total': len(ids)})
+
+
+def client(session, **kwargs):
+    client = CodebeamerClient(('u', 'p'), url='https://codebeamer', **kwargs)
+    client.session = session
+    return client
+
+
+class BlockingSession(FakeSession):
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def get(self, url, auth=None, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+        return super().get(url, auth, **kwargs)
+
+
+def test_concurrent_lookups_of_an_id_share_one_request():
+    session = BlockingSession()
+    codebeamer = client(session, bulk_query=False)
+    results = []
+    lookup = lambda: results.append(codebeamer.get_items(['1', 1]))
+
+    first = threading.Thread(target=lookup)
+    first.start()
+    session.started.wait(5)
+    second = threading.Thread(target=lookup)
+    second.start()
+    second.join(0.2)
+    session.release.set()
+    first.join(5)
+    second.join(5)
+
+    assert session.gets == ['https://codebeamer/api/v3/items/1']
+    assert [list(result) for result in results] == [['1'], ['1']]
+    assert results[0]['1'] is results[1]['1']
+
+
+def test_uncached_ids_are_resolved_with_one_bulk_query():
+    session = FakeSession()
+    codebeamer = client(session, bulk_query=True)
+
+    items = codebeamer.get_items(['1', '2', '3'])
+    codebeamer.get_items(['2', '3'])
+
+    assert sorted(items) == ['1', '2', '3']
+    assert session.queries == ['item.id IN (1, 2, 3)']
+    assert session.gets == []
+
+
+def test_bulk_queries_are_chunked():
+    session = FakeSession()
+
+    items = client(session, bulk_query=True).get_items(range(1, 151))
+
+    assert len(items) == 150
+    assert len(session.queries) == 2
+
+
+def test_fresh_lookup_bypasses_memo_and_store(tmp_path):
+    session = FakeSession()
+    codebeamer = client(session, bulk_query=False, store=CodebeamerItemStore(str(tmp_path)))
+    codebeamer.get_items(['1'], fields=('status',))
+    session.status = 'Done'
+
+    cached = client(session, bulk_query=False, store=codebeamer.store).get_items(['1'], fields=('status',))
+    fresh = codebeamer.get_items(['1'], fields=('status',), fresh=True)
+
+    assert cached['1'].status == {'name': 'New'}
+    assert fresh['1'].status == {'name': 'Done'}
+    assert len(session.gets) == 2
+
+
+def test_interrupted_lookup_leaves_a_claim_of_another_lookup_pending():
+    codebeamer = client(FakeSession(), bulk_query=False)
+    claims = {}
+
+    def fetch(ids):
+        # The failed id is claimed again by another lookup before this one returns
+        codebeamer._settle('1', error=Exception('Not found'))
+        claims.update(codebeamer._claim(['1'])[0])
+
+    codebeamer._fetch_concurrently = fetch
+
+    assert codebeamer.get_items(['1']) == {}
+    assert codebeamer._pending['1'] is claims['1']
+    assert not claims['1'].done()
@@ -0,0 +1,31 @@
+import libs.codebeamer_cache
+from libs.codebeamer_cache import CodebeamerItemStore
+
+
+def test_fields_are_trusted_for_their_own_ttl(tmp_path, monkeypatch):
+    monkeypatch.setattr(libs.codebeamer_cache, 'time', lambda: 1000)
+    store = CodebeamerItemStore(str(tmp_path))
+    store.put('1', {'id': 1, 'version': 1, 'teams': [], 'status': {'name': 'New'}})
+
+    monkeypatch.setattr(libs.codebeamer_cache, 'time', lambda: 1000 + 600)
+
+    assert store.get('1', ('teams',)) is not None
+    assert store.get('1', ('teams', 'status')) is None
+    assert store.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_older_version_does_not_replace_a_newer_one(tmp_path):
+    store = CodebeamerItemStore(str(tmp_path))
+    store.put('1', {'id': 1, 'version': 3, 'name': 'new'})
+    store.put('1', {'id': 1, 'version': 2, 'name': 'old'})
+
+    assert store.get('1', ('name',))['name'] == 'new'
+
+
+def test_invalidated_item_is_fetched_again(tmp_path):
+    store = CodebeamerItemStore(str(tmp_path))
+    store.put('1', {'id': 1, 'version': 1, 'name': 'a'})
+
+    store.invalidate('1')
+
+    assert store.get('1', ('name',)) is None
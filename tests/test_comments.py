@@ -0,0 +1,77 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import libs.utils
+from libs.utils import CommentStore, pull_request_comment
+
+
+class FakeComment:
+    def __init__(self, issue, body):
+        self.issue = issue
+        self.body = body
+
+    def edit(self, body):
+        self.issue.edits.append(body)
+        self.body = body
+
+    def delete(self):
+        self.issue.comments.remove(self)
+
+
+class FakeIssue:
+    def __init__(self, bodies):
+        self.comments = [FakeComment(self, body) for body in bodies]
+        self.listings = 0
+        self.edits = []
+
+    def get_comments(self):
+        self.listings += 1
+        return list(self.comments)
+
+
+class FakePullRequest:
+    def __init__(self, bodies=()):
+        self.base = SimpleNamespace(repo=SimpleNamespace(full_name="test/comments"))
+        self.number = 2
+        self.issue = FakeIssue(bodies)
+
+    def as_issue(self):
+        return self.issue
+
+    def create_issue_comment(self, body):
+        comment = FakeComment(self.issue, body)
+        self.issue.comments.append(comment)
+        return comment
+
+
+@pytest.fixture(autouse=True)
+def comment_stores(monkeypatch):
+    monkeypatch.setattr(libs.utils, '_comment_stores', {})
+
+
+def metadata(id):
+    return f"<!--{json.dumps({'id': id})}-->"
+
+
+def test_comments_are_listed_once_and_edited_in_place():
+    pr = FakePullRequest(["Unrelated", f"Build started\n{metadata('jenkins-a')}"])
+
+    pull_request_comment(pr, 'jenkins-a', "Build passed")
+    pull_request_comment(pr, 'jenkins-b', "Build started")
+    pull_request_comment(pr, 'jenkins-b', "Build failed")
+
+    assert pr.issue.listings == 1
+    assert len(pr.issue.comments) == 3
+    assert [body.splitlines()[0] for body in pr.issue.edits] == ["Build passed", "Build failed"]
+
+
+def test_deleted_comment_is_removed_from_the_index():
+    pr = FakePullRequest([f"Report\n{metadata('sonar-report')}"])
+    store = CommentStore(pr)
+
+    store.delete('sonar-report')
+
+    assert pr.issue.comments == []
+    assert store.get('sonar-report') is None
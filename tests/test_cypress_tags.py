@@ -0,0 +1,60 @@
+import importlib.util
+import os
+from types import SimpleNamespace
+
+
+spec = importlib.util.spec_from_file_location('get_cypress_tags_main', os.path.join(os.path.dirname(__file__), '..', 'get_cypress_tags', 'main.py'))
+get_cypress_tags = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(get_cypress_tags)
+
+
+def module(id, tags):
+    return SimpleNamespace(id=id, version=1, custom_field=lambda name: [{'name': tag} for tag in tags])
+
+
+class FakeCodebeamerClient:
+    def __init__(self, tags):
+        self.tags = tags
+        self.fetched = []
+        self.queries = []
+
+    def get_items(self, ids, fields=(), fresh=False):
+        self.fetched.append((sorted(ids), fresh))
+        return {id: module(id, self.tags[id]) for id in ids}
+
+    def query_items(self, query_string):
+        self.queries.append(query_string)
+        return {id: module(id, self.tags[id]) for id in self.tags if id == '2'}
+
+
+def index(tmp_path, modules, **kwargs):
+    index = get_cypress_tags.CypressTagIndex(str(tmp_path / 'index.json'), **kwargs)
+    index.modules = modules
+    return index
+
+
+def test_expired_and_missing_modules_are_fetched_fresh(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_cypress_tags, 'time', lambda: 100000)
+    client = FakeCodebeamerClient({'1': ['@new'], '2': ['@b']})
+    tag_index = index(tmp_path, {'1': {'version': 1, 'fetched_at': 0, 'tags': ['@old']}}, max_age=3600, check_changes=False)
+
+    tags = tag_index.get_tags(client, ['1', '2'])
+
+    assert tags == {'1': ['@new'], '2': ['@b']}
+    assert client.fetched == [(['1', '2'], True)]
+
+
+def test_changed_modules_are_found_with_a_time_zone_margin(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_cypress_tags, 'time', lambda: 86400 * 2)
+    client = FakeCodebeamerClient({'1': ['@a'], '2': ['@edited']})
+    fetched_at = 86400 * 2 - 600
+    tag_index = index(tmp_path, {
+        '1': {'version': 1, 'fetched_at': fetched_at, 'tags': ['@a']},
+        '2': {'version': 1, 'fetched_at': fetched_at, 'tags': ['@b']}
+    })
+
+    tags = tag_index.get_tags(client, ['1', '2'])
+
+    assert tags == {'1': ['@a'], '2': ['@edited']}
+    assert client.fetched == []
+    assert client.queries == ["item.id IN (1, 2) AND modifiedAt >= '1970-01-02 09:50:00'"]
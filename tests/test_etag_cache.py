@@ -0,0 +1,66 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from libs.etag_cache import EtagCachingAdapter, EtagStore
+
+
+class FakeServer:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(dict(request.headers))
+        status, headers, body = self.responses.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        return response
+
+
+def session(tmp_path, monkeypatch, server, max_size=1024 * 1024):
+    monkeypatch.setattr(HTTPAdapter, 'send', lambda adapter, request, **kwargs: server.send(request, **kwargs))
+    store = EtagStore(str(tmp_path), max_size)
+    session = requests.Session()
+    session.mount('https://', EtagCachingAdapter(store))
+    return session, store
+
+
+def test_not_modified_response_is_replayed_from_the_store(tmp_path, monkeypatch):
+    server = FakeServer(
+        (200, {'ETag': '"v1"', 'Content-Type': 'application/json', 'X-RateLimit-Remaining': '10'}, b'{"a": 1}'),
+        (304, {'ETag': '"v1"', 'X-RateLimit-Remaining': '9'}, b'')
+    )
+    github, store = session(tmp_path, monkeypatch, server)
+
+    github.get('https://api.github.com/repos/a/b', headers={'Authorization': 'token x'})
+    response = github.get('https://api.github.com/repos/a/b', headers={'Authorization': 'token x'})
+
+    assert response.status_code == 200
+    assert response.json() == {'a': 1}
+    assert response.headers['X-RateLimit-Remaining'] == '9'
+    assert server.requests[1]['If-None-Match'] == '"v1"'
+    assert store.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_entries_are_not_shared_between_tokens(tmp_path, monkeypatch):
+    server = FakeServer((200, {'ETag': '"v1"'}, b'{}'), (200, {'ETag': '"v1"'}, b'{}'))
+    github, store = session(tmp_path, monkeypatch, server)
+
+    github.get('https://api.github.com/repos/a/b', headers={'Authorization': 'token x'})
+    github.get('https://api.github.com/repos/a/b', headers={'Authorization': 'token y'})
+
+    assert 'If-None-Match' not in server.requests[1]
+
+
+def test_store_evicts_least_recently_used_entries(tmp_path):
+    store = EtagStore(str(tmp_path), 200)
+    store.put('a', {'body': 'x' * 80})
+    store.put('b', {'body': 'x' * 80})
+    store.put('c', {'body': 'x' * 80})
+
+    assert store.get('a') is None
+    assert store.get('c') is not None
@@ -0,0 +1,166 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import libs.utils
+from libs.utils import BuildStatus, ConsoleStream, JenkinsWrapper
+
+
+def response(status, body=None):
+    r = requests.Response()
+    r.status_code = status
+    r.url = 'http://jenkins'
+    r._content = b'{}' if body is None else body
+    return r
+
+
+class FakeSession:
+    def __init__(self, post_status=200, building=False):
+        self.post_status = post_status
+        self.building = building
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        self.posts.append(url)
+        return response(self.post_status)
+
+    def get(self, url, **kwargs):
+        return response(200, b'{"building": %s, "result": null}' % (b'true' if self.building else b'false'))
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(libs.utils, 'sleep', lambda seconds: None)
+
+
+def jenkins(session, values):
+    wrapper = JenkinsWrapper('http://jenkins', auth=None)
+    wrapper.session = session
+    wrapper.get_crumb = lambda: {}
+    wrapper._query_xml_values = lambda endpoint, tag: values
+    wrapper._has_xml_values = lambda endpoint, tag: False
+    return wrapper
+
+
+JOB = SimpleNamespace(url='http://jenkins/job/a/')
+
+
+def test_stopped_builds_are_verified():
+    session = FakeSession()
+
+    assert jenkins(session, ['1', '2']).stop_running_builds(JOB, 'pr')
+    assert sorted(session.posts) == ['http://jenkins/job/a/1/stop', 'http://jenkins/job/a/2/stop']
+
+
+def test_failed_stop_is_raised_after_every_build_is_tried():
+    session = FakeSession(post_status=500)
+
+    with pytest.raises(Exception, match='2 of 2') as error:
+        jenkins(session, ['1', '2']).stop_running_builds(JOB, 'pr')
+
+    assert len(session.posts) == 2
+    assert isinstance(error.value.__cause__, requests.HTTPError)
+
+
+def test_builds_still_running_are_raised(monkeypatch):
+    monkeypatch.setattr(libs.utils, 'time', iter(range(0, 1000, 30)).__next__)
+
+    with pytest.raises(Exception, match='not verified'):
+        jenkins(FakeSession(building=True), ['1']).stop_running_builds(JOB, 'pr')
+
+
+def test_failed_cancel_is_raised():
+    session = FakeSession(post_status=500)
+
+    with pytest.raises(Exception, match='cancel_item'):
+        jenkins(session, ['7']).remove_from_queue('http://jenkins/job/a/', 'pr')
+
+
+def test_cancel_answered_with_not_found_is_verified():
+    session = FakeSession(post_status=404)
+
+    jenkins(session, ['7']).remove_from_queue('http://jenkins/job/a/', 'pr')
+
+    assert session.posts == ['http://jenkins/queue/cancelItem']
+
+
+def test_invalidate_by_name_keeps_the_crumb():
+    wrapper = JenkinsWrapper('http://jenkins', auth=None)
+    wrapper._resolve(('crumb',), lambda: {'Jenkins-Crumb': 'a'})
+    wrapper._resolve(('job', 'a'), lambda: 'job a')
+    wrapper._resolve(('job', 'b'), lambda: 'job b')
+
+    wrapper.invalidate(name='a')
+
+    assert sorted(wrapper._cache) == [('crumb',), ('job', 'b')]
+
+
+class StreamingSession:
+    def __init__(self, body, headers={}):
+        self.body = body
+        self.headers = headers
+        self.requests = []
+
+    def get(self, url, params=None, **kwargs):
+        self.requests.append((url, params))
+        r = response(200, self.body)
+        r.raw = io.BytesIO(self.body)
+        r.headers.update(self.headers)
+        return r
+
+
+def test_build_status_is_read_with_one_tree_filtered_request():
+    session = StreamingSession(b'{"building": false, "result": "UNSTABLE", "duration": 5000, "actions": [{}, {"totalCount": 10, "failCount": 2, "skipCount": 1}]}')
+    wrapper = jenkins(session, [])
+
+    status = wrapper.get_build_status_by_url('http://jenkins/job/a/1/')
+
+    assert session.requests == [('http://jenkins/job/a/1/api/json', {'tree': BuildStatus.tree})]
+    assert (status.building, status.result, status.duration) == (False, 'UNSTABLE', 5000)
+    assert status.test_report == {'passCount': 7, 'failCount': 2, 'skipCount': 1}
+
+
+def test_xml_values_are_streamed():
+    session = StreamingSession(b'<root><number>3</number><other>x</other><number>4</number></root>')
+    wrapper = JenkinsWrapper('http://jenkins', auth=None)
+    wrapper.session = session
+
+    assert wrapper._query_xml_values('http://jenkins/job/a/api/xml', 'number') == ['3', '4']
+    assert wrapper._has_xml_values('http://jenkins/job/a/api/xml', 'other')
+    assert not wrapper._has_xml_values('http://jenkins/job/a/api/xml', 'id')
+
+
+def test_console_is_streamed_from_the_last_offset():
+    output = io.StringIO()
+    console = ConsoleStream('ERROR|done', prefix='[a] ', output=output)
+    wrapper = JenkinsWrapper('http://jenkins', auth=None)
+    wrapper.session = StreamingSession(b'step 1\nERROR one\nERROR par', {'X-Text-Size': '27', 'X-More-Data': 'true'})
+
+    assert wrapper.stream_console('http://jenkins/job/a/1/', console)
+    wrapper.session = StreamingSession(b'tial\ndone', {'X-Text-Size': '36'})
+    assert not wrapper.stream_console('http://jenkins/job/a/1/', console)
+
+    assert wrapper.session.requests[0][1] == {'start': 27}
+    assert output.getvalue().splitlines() == ['[a] ERROR one', '[a] ERROR partial', '[a] done']
+
+
+def test_only_failed_test_cases_are_read():
+    session = StreamingSession(
+        b'<report><passCount>8</passCount><failCount>2</failCount><skipCount>0</skipCount>'
+        b'<case><className>a.B</className><name>fails</name><status>FAILED</status></case>'
+        b'<case><className>a.C</className><name>regressed</name><status>REGRESSION</status></case></report>'
+    )
+    wrapper = JenkinsWrapper('http://jenkins', auth=None)
+    wrapper.session = session
+
+    report = wrapper.get_failed_test_cases(SimpleNamespace(url='http://jenkins/job/a/1/'))
+
+    assert report == {
+        'cases': [('a.B', 'fails', 'FAILED'), ('a.C', 'regressed', 'REGRESSION')],
+        'passCount': 8,
+        'failCount': 2,
+        'skipCount': 0
+    }
+    assert "//case[status='FAILED' or status='REGRESSION']" in session.requests[0][1]['xpath']
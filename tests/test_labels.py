@@ -0,0 +1,48 @@
+import pytest
+
+from libs.utils import get_pull_request_context, reconcile_labels, replace_labels
+
+
+@pytest.fixture
+def pull_request(github, repo, run_with_timeout):
+    def create(labels):
+        repo.add_pull(3, labels=labels)
+        context = get_pull_request_context(github, repo.full_name, 3)
+        return run_with_timeout(lambda: context.pr)
+
+    return create
+
+
+def test_reconcile_through_context_without_changes_makes_no_write(pull_request, run_with_timeout):
+    pr = pull_request(['Team A', 'priority:High'])
+
+    changed = run_with_timeout(lambda: reconcile_labels(pr, ['Team A'], {'priority': 'High'}))
+
+    assert not changed
+    assert pr.writes == []
+
+
+def test_reconcile_through_context_uses_single_write(pull_request, run_with_timeout):
+    pr = pull_request(['Team A', 'priority:Low'])
+
+    run_with_timeout(lambda: reconcile_labels(pr, ['Team A', 'Team B'], {'priority': 'High'}))
+
+    assert pr.writes == [('set', ('Team A', 'Team B', 'priority:High'))]
+
+
+def test_additions_only_are_added_and_context_is_refreshed(pull_request, run_with_timeout):
+    pr = pull_request(['Team A'])
+
+    run_with_timeout(lambda: reconcile_labels(pr, ['Team B']))
+    run_with_timeout(lambda: reconcile_labels(pr, ['Team B']))
+
+    assert pr.writes == [('add', ('Team B',))]
+    assert pr.reads['labels'] == 2
+
+
+def test_replace_labels_removes_prefixed_label(pull_request, run_with_timeout):
+    pr = pull_request(['Team A', 'priority:Low'])
+
+    run_with_timeout(lambda: replace_labels(pr, 'priority', None))
+
+    assert pr.writes == [('remove', 'priority:Low')]
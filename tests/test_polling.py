@@ -0,0 +1,92 @@
+import pytest
+
+import libs.utils
+from libs.polling import Backoff, PollingSchedule
+from libs.utils import BuildStatus, wait_for_builds
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeJenkins:
+    def __init__(self, clock, finishes_after, estimate=3600, failures=0):
+        self.clock = clock
+        self.started_at = clock.now
+        self.finishes_after = finishes_after
+        self.estimate = estimate
+        self.failures = failures
+        self.reads = 0
+
+    def get_build_status(self, build):
+        self.reads += 1
+        if self.failures:
+            self.failures -= 1
+            raise Exception("Connection reset")
+        finished = self.clock.now - self.started_at >= self.finishes_after
+        return BuildStatus({
+            'building': not finished,
+            'result': 'FAILURE' if finished else None,
+            'estimatedDuration': self.estimate * 1000,
+            'timestamp': self.started_at * 1000
+        })
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(libs.utils, 'time', clock.time)
+    monkeypatch.setattr(libs.utils, 'sleep', clock.sleep)
+    return clock
+
+
+def test_early_failure_is_detected_within_the_interval(clock):
+    jenkins = FakeJenkins(clock, finishes_after=60)
+
+    statuses = wait_for_builds(jenkins, {'url': object()}, timeout=7200, interval=5)
+
+    assert statuses['url'].result == 'FAILURE'
+    assert clock.now - jenkins.started_at <= 65
+
+
+def test_larger_ceiling_polls_less_often_far_from_the_estimate(clock):
+    jenkins = FakeJenkins(clock, finishes_after=3600)
+
+    wait_for_builds(jenkins, {'url': object()}, timeout=7200, interval=5, max_interval=300)
+
+    assert jenkins.reads < 3600 / 5 / 4
+
+
+def test_failed_status_reads_are_counted(clock, caplog):
+    jenkins = FakeJenkins(clock, finishes_after=10, failures=2)
+
+    with caplog.at_level('INFO'):
+        wait_for_builds(jenkins, {'url': object()}, timeout=600, interval=5)
+
+    assert f"Build status polled {jenkins.reads} times" in caplog.text
+
+
+def test_schedule_gets_denser_towards_the_estimate():
+    schedule = PollingSchedule(5, 300, expected_duration=3600)
+
+    intervals = [schedule.next_interval(elapsed) for elapsed in (0, 3000, 3590, 4000)]
+
+    assert intervals == [300, 150, 5, 5]
+    assert schedule.polls == 4
+
+
+def test_backoff_grows_with_jitter_up_to_the_maximum():
+    backoff = Backoff(2, 60)
+
+    intervals = [backoff.next_interval() for _ in range(8)]
+
+    assert 1 <= intervals[0] <= 2
+    assert all(30 <= interval <= 60 for interval in intervals[5:])
+    assert backoff.attempts == 8
@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from libs.utils import PullRequestContext
+
+
+def test_nested_loaders_do_not_block(github, repo, run_with_timeout):
+    repo.add_pull(1, files=['a.py', 'b.py'])
+    context = PullRequestContext(github, repo.full_name, 1)
+
+    pr = run_with_timeout(lambda: context.pr)
+    files = run_with_timeout(lambda: context.files)
+
+    assert pr.number == 1
+    assert files == ['a.py', 'b.py']
+
+
+def test_values_are_loaded_once(github, repo):
+    context = PullRequestContext(github, repo.full_name, 1)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        prs = list(executor.map(lambda _: context.pr, range(16)))
+
+    assert all(pr is prs[0] for pr in prs)
+    assert github.repo_reads == 1
+    assert repo.pull_reads == 1
+
+
+def test_refresh_reloads_value(github, repo):
+    context = PullRequestContext(github, repo.full_name, 1)
+
+    context.pr
+    context.refresh('pr')
+    context.pr
+
+    assert repo.pull_reads == 2
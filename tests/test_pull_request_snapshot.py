@@ -0,0 +1,87 @@
+import pytest
+
+from libs.github_graphql import GithubGraphQl
+from libs.utils import collectIds, get_pull_request_context, get_requested_team_slugs, reconcile_labels
+
+
+SNAPSHOT = {
+    'commits': [{'sha': 'a', 'message': "Work on #7654321"}, {'sha': 'b', 'message': "Refs #1234567"}],
+    'files': [{'path': 'src/a.py'}],
+    'labels': ['Team A'],
+    'review_requests': {'users': [], 'teams': ['team-a']}
+}
+
+
+class FakeGraphQl:
+    def __init__(self):
+        self.loaded = []
+
+    def get_pull_request_snapshot(self, owner, repository_name, number, connections):
+        self.loaded.extend(connections)
+        return {key: value for key, value in SNAPSHOT.items() if key in connections or key == 'review_requests' and 'reviewRequests' in connections}
+
+
+@pytest.fixture
+def pull_request(github, repo, ticket_id_store, run_with_timeout):
+    def create(gql):
+        repo.add_pull(5, title="Fix #1234567")
+        context = get_pull_request_context(github, repo.full_name, 5, gql)
+        return context, run_with_timeout(lambda: context.pr)
+
+    return create
+
+
+def assert_no_rest_reads(pr):
+    assert pr.reads == {'commits': 0, 'labels': 0, 'files': 0, 'review_requests': 0}
+
+
+def test_readers_share_one_snapshot(pull_request, run_with_timeout):
+    gql = FakeGraphQl()
+    context, pr = pull_request(gql)
+
+    ids = run_with_timeout(lambda: collectIds(pr))
+    changed = run_with_timeout(lambda: reconcile_labels(pr, ['Team A']))
+
+    assert ids == ['1234567', '7654321']
+    assert not changed
+    assert get_requested_team_slugs(pr) == ['team-a']
+    assert context.file_names == ['src/a.py']
+    assert sorted(gql.loaded) == ['commits', 'files', 'labels', 'reviewRequests']
+    assert_no_rest_reads(pr)
+
+
+def test_label_write_refreshes_snapshot(pull_request, run_with_timeout):
+    gql = FakeGraphQl()
+    context, pr = pull_request(gql)
+
+    run_with_timeout(lambda: reconcile_labels(pr, ['Team B']))
+    context.label_names
+    context.file_names
+    context.file_names
+
+    assert pr.writes == [('add', ('Team B',))]
+    assert sorted(gql.loaded) == ['files', 'labels', 'labels']
+    assert_no_rest_reads(pr)
+
+
+def test_snapshot_pages_only_requested_connections(monkeypatch):
+    queries = []
+    pages = [
+        {'id': 'PR', 'number': 5, 'title': 't', 'body': None, 'isDraft': False, 'headRefOid': 'b', 'headRefName': 'h', 'baseRefName': 'm',
+         'labels': {'pageInfo': {'hasNextPage': True, 'endCursor': 'c1'}, 'nodes': [{'name': 'Team A'}]}},
+        {'labels': {'pageInfo': {'hasNextPage': False, 'endCursor': None}, 'nodes': [{'name': 'Team B'}]}}
+    ]
+
+    def run_query(query):
+        queries.append(query)
+        return {'data': {'repository': {'pullRequest': pages[len(queries) - 1]}}}
+
+    gql = GithubGraphQl('token')
+    monkeypatch.setattr(gql, 'run_query', run_query)
+
+    snapshot = gql.get_pull_request_snapshot('test', 'snapshot', 5, ('labels',))
+
+    assert snapshot['labels'] == ['Team A', 'Team B']
+    assert 'comments' not in snapshot and 'files' not in snapshot
+    assert 'reviewThreads' not in queries[0] and 'files' not in queries[0]
+    assert '"c1"' in queries[1] and 'title' not in queries[1]
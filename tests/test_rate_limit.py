@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from libs.rate_limit import RateLimitGovernor
+from libs.transport import PooledSession
+
+
+def test_reads_do_not_use_write_tokens():
+    governor = RateLimitGovernor(60, 600)
+
+    governor.acquire('GET')
+    governor.acquire('POST', 'graphql', write=False)
+
+    assert governor.minute_bucket.tokens == 3
+    assert governor.hour_bucket.tokens == 600
+
+
+def test_writes_use_write_tokens():
+    governor = RateLimitGovernor(60, 600)
+
+    governor.acquire('POST')
+    governor.acquire('POST', 'graphql', write=True)
+
+    assert governor.minute_bucket.tokens < 2
+    assert governor.hour_bucket.tokens < 599
+
+
+def test_session_passes_write_flag_to_governor():
+    governor = mock.Mock(max_attempts=1)
+    governor.update.return_value = False
+    session = PooledSession(10, governor=governor, resource='graphql')
+
+    with mock.patch('requests.Session.request', return_value=SimpleNamespace(status_code=200)) as request:
+        session.post('https://api.github.com/graphql', json={'query': '{ viewer { login } }'}, write=False)
+
+    governor.acquire.assert_called_once_with('POST', 'graphql', False)
+    assert 'write' not in request.call_args.kwargs
+
+
+def test_graphql_mutations_are_writes():
+    from libs.github_graphql import GithubGraphQl
+
+    with mock.patch('libs.github_graphql.get_session') as get_session:
+        get_session.return_value.post.return_value = SimpleNamespace(status_code=200, json=lambda: {'data': {}})
+        gql = GithubGraphQl('token')
+        gql.run_query("{ viewer { login } }")
+        gql.run_query("\n  mutation { convertPullRequestToDraft(input: {}) { clientMutationId } }")
+
+    writes = [call.kwargs['write'] for call in get_session.return_value.post.call_args_list]
+    assert writes == [False, True]
+
+
+def test_budget_reflects_response_headers(monkeypatch):
+    import libs.rate_limit
+    from libs.utils import get_github_budget, get_github_governor
+
+    monkeypatch.setattr(libs.rate_limit, '_governor', RateLimitGovernor(60, 600))
+    response = SimpleNamespace(status_code=200, text='', headers={'X-RateLimit-Remaining': '42', 'X-RateLimit-Reset': '2000000000', 'X-RateLimit-Limit': '5000'})
+    get_github_governor().update(response, 'core')
+
+    assert get_github_budget()['limits']['core']['remaining'] == 42
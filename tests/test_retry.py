@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from libs.retry import RetryError, RetryPolicy, is_retryable, map_in_context, remaining_budget, retry_after
+
+
+def http_error(status, headers={}, text=''):
+    return requests.HTTPError(f"{status} Error", response=SimpleNamespace(status_code=status, headers=headers, text=text))
+
+
+def wrapped(error):
+    try:
+        raise Exception("Helper failed") from error
+    except Exception as e:
+        return e
+
+
+@pytest.mark.parametrize('error', [
+    http_error(502),
+    http_error(429),
+    http_error(403, {'X-RateLimit-Remaining': '0'}),
+    requests.exceptions.ConnectionError(),
+    requests.exceptions.ReadTimeout(),
+    TimeoutError(),
+    Exception("Build not started yet"),
+    wrapped(http_error(503)),
+    wrapped(requests.exceptions.ConnectionError())
+])
+def test_transient_errors_are_retried(error):
+    assert is_retryable(error)
+
+
+@pytest.mark.parametrize('error', [
+    http_error(404),
+    http_error(403),
+    http_error(422),
+    TypeError(),
+    KeyError('id'),
+    AttributeError(),
+    RetryError('TIMEOUT'),
+    wrapped(KeyError('id')),
+    wrapped(http_error(401))
+])
+def test_other_errors_fail_fast(error):
+    assert not is_retryable(error)
+
+
+def test_programming_error_is_raised_on_first_attempt():
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        return {}['missing']
+
+    with pytest.raises(KeyError):
+        RetryPolicy(60, 1)(broken)()
+
+    assert len(attempts) == 1
+
+
+def test_retry_after_header_is_honoured():
+    assert retry_after(http_error(429, {'Retry-After': '7'})) == 7
+
+
+def test_deadline_reaches_worker_threads():
+    def budget(_):
+        return remaining_budget()
+
+    def run():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return map_in_context(executor, budget, range(4))
+
+    budgets = RetryPolicy(30, 1)(run)()
+
+    assert all(budget is not None and 0 < budget <= 30 for budget in budgets)
@@ -0,0 +1,86 @@
+import pytest
+import requests
+
+import libs.utils
+from libs.utils import create_review
+
+
+def response(status, headers={}):
+    r = requests.Response()
+    r.status_code = status
+    r.headers.update(headers)
+    r._content = b'{}'
+    return r
+
+
+class FakeSession:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.posts = 0
+
+    def post(self, url, headers, data):
+        self.posts += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr('libs.retry.sleep', lambda seconds: None)
+
+
+def use_session(monkeypatch, session):
+    monkeypatch.setattr(libs.utils, 'get_session', lambda name: session)
+
+
+def comments(count):
+    return [{'path': 'a.py', 'line': line, 'body': 'x'} for line in range(count)]
+
+
+def test_review_is_sent_again_when_it_did_not_reach_github(monkeypatch):
+    session = FakeSession(requests.exceptions.ConnectionError(), response(429, {'Retry-After': '0'}), response(200))
+    use_session(monkeypatch, session)
+
+    submitted, rejected = create_review('https://api/pr', 'token', 'abc', comments(2))
+
+    assert session.posts == 3
+    assert len(submitted) == 2 and rejected == []
+
+
+@pytest.mark.parametrize('outcome', [response(502), requests.exceptions.ReadTimeout()])
+def test_review_is_not_sent_again_when_github_may_have_created_it(monkeypatch, outcome):
+    session = FakeSession(outcome, response(200))
+    use_session(monkeypatch, session)
+
+    with pytest.raises(Exception):
+        create_review('https://api/pr', 'token', 'abc', comments(2))
+
+    assert session.posts == 1
+
+
+class FlakyGraphQl:
+    def __init__(self):
+        self.listings = 0
+        self.deleted = []
+
+    def get_review_comment_ids(self, owner, repository_name, number, user_name):
+        self.listings += 1
+        if self.listings == 1:
+            raise Exception("Failed to run query. Return code: 502.")
+        return [{'id': 'c1'}, {'id': 'c2'}]
+
+    def delete_review_comment(self, id):
+        self.deleted.append(id)
+
+
+def test_review_comment_listing_is_retried(monkeypatch):
+    monkeypatch.setattr(libs.utils, 'getGithubEvent', lambda: {'number': 4, 'pull_request': {'base': {'repo': {'full_name': 'test/review'}}}})
+    gql = FlakyGraphQl()
+
+    report = libs.utils.delete_review_comments(object(), 'github-actions[bot]', gql=gql, timeout=60, interval=1)
+
+    assert gql.listings == 2
+    assert sorted(gql.deleted) == ['c1', 'c2']
+    assert sorted(report['deleted']) == ['c1', 'c2']
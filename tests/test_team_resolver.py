@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+from libs.utils import TeamResolver
+
+
+class NotFound(Exception):
+    status = 404
+
+
+class FakeOrganization:
+    def __init__(self, teams):
+        self.teams = teams
+        self.lookups = []
+        self.listings = 0
+
+    def get_team_by_slug(self, slug):
+        self.lookups.append(slug)
+        for name, team_slug in self.teams.items():
+            if team_slug == slug:
+                return SimpleNamespace(name=name, slug=slug)
+        raise NotFound(slug)
+
+    def get_teams(self):
+        self.listings += 1
+        return [SimpleNamespace(name=name, slug=slug) for name, slug in self.teams.items()]
+
+
+def test_teams_are_resolved_by_slug_without_listing():
+    organization = FakeOrganization({'Team A': 'team-a', 'Core & Platform': 'core-platform'})
+    resolver = TeamResolver(organization)
+
+    resolved = resolver.resolve(['Team A', 'Core & Platform', 'Team A'])
+
+    assert resolved == {'Team A': 'team-a', 'Core & Platform': 'core-platform'}
+    assert organization.listings == 0
+    assert organization.lookups.count('team-a') == 1
+
+
+def test_unusual_slug_falls_back_to_one_listing():
+    organization = FakeOrganization({'Team B': 'renamed-team', 'Team C': 'other'})
+    resolver = TeamResolver(organization)
+
+    assert resolver.resolve(['Team B', 'Team C', 'Unknown']) == {'Team B': 'renamed-team', 'Team C': 'other'}
+    assert organization.listings == 1
+
+
+def test_other_errors_are_raised():
+    organization = FakeOrganization({})
+
+    def get_team_by_slug(slug):
+        raise RuntimeError("Bad credentials")
+
+    organization.get_team_by_slug = get_team_by_slug
+
+    with pytest.raises(RuntimeError):
+        TeamResolver(organization).resolve(['Team A'])
@@ -0,0 +1,76 @@
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import libs.utils
+
+
+spec = importlib.util.spec_from_file_location('ticket_batch_main', os.path.join(os.path.dirname(__file__), '..', 'ticket_batch', 'main.py'))
+ticket_batch = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ticket_batch)
+
+
+class FakeGraphQl:
+    def __init__(self, pull_requests):
+        self.pull_requests = pull_requests
+
+    def get_open_pull_requests(self, owner, repository_name):
+        return self.pull_requests
+
+
+class FakeCodebeamerClient:
+    def __init__(self):
+        self.requested = []
+
+    def get_items(self, ids, fields=()):
+        ids = [str(id) for id in ids]
+        self.requested.append(sorted(ids))
+        return {id: SimpleNamespace(id=id, teams=[f"Team {id}"], priority={'id': 1, 'name': 'High'}) for id in ids}
+
+
+def pull_request(number, head_sha='a'):
+    return {
+        'number': number,
+        'title': f"Ticket #100000{number}",
+        'body': None,
+        'draft': False,
+        'head_sha': head_sha,
+        'commits': [{'sha': head_sha, 'message': "Shared #2000000"}],
+        'complete': True
+    }
+
+
+@pytest.fixture
+def client(ticket_id_store, monkeypatch):
+    client = FakeCodebeamerClient()
+    monkeypatch.setattr(libs.utils, 'get_codebeamer_client', lambda auth: client)
+    monkeypatch.setattr(ticket_batch, 'get_codebeamer_client', lambda auth: client)
+    return client
+
+
+def test_workers_complete_and_write_checkpoint(client, github, repo, tmp_path, run_with_timeout):
+    checkpoint = ticket_batch.Checkpoint(str(tmp_path / 'checkpoint.json'))
+    gql = FakeGraphQl([pull_request(number) for number in range(1, 9)])
+
+    report = run_with_timeout(lambda: ticket_batch.run_batch(github, gql, repo, ('u', 'p'), ['autolabel'], checkpoint, 4), timeout=10)
+
+    assert report == {'processed': 8, 'skipped': 0, 'failed': []}
+    assert client.requested[0] == sorted([f"100000{number}" for number in range(1, 9)] + ['2000000'])
+    assert repo.pulls[3].labels == {'Team 1000003', 'Team 2000000', 'priority:High'}
+    assert len(ticket_batch.Checkpoint(checkpoint.path).done) == 8
+    # Commits are taken from the GraphQL listing
+    assert all(pr.reads['commits'] == 0 for pr in repo.pulls.values())
+
+
+def test_checkpoint_skips_unchanged_pull_requests(client, github, repo, tmp_path, run_with_timeout):
+    checkpoint = ticket_batch.Checkpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.mark(pull_request(1))
+    checkpoint.mark(pull_request(2))
+    gql = FakeGraphQl([pull_request(1), pull_request(2, head_sha='b'), pull_request(3)])
+
+    report = run_with_timeout(lambda: ticket_batch.run_batch(github, gql, repo, ('u', 'p'), ['autolabel'], checkpoint, 2), timeout=10)
+
+    assert report == {'processed': 2, 'skipped': 1, 'failed': []}
+    assert sorted(repo.pulls) == [2, 3]
@@ -0,0 +1,44 @@
+import pytest
+
+from conftest import commit
+from libs.ticket_ids import TicketIdIndex, TicketIdStore
+from libs.utils import collectIds, get_pull_request_context, get_ticket_index
+
+
+@pytest.fixture(autouse=True)
+def store(ticket_id_store):
+    return ticket_id_store
+
+
+def test_collect_ids_with_context_scans_commits_once(github, repo, run_with_timeout):
+    repo.add_pull(7, commits=[commit("a", "Work on #7654321"), commit("b", "Refs #1234567")], title="Fix #1234567", body="See #42")
+    context = get_pull_request_context(github, repo.full_name, 7)
+    pr = run_with_timeout(lambda: context.pr)
+
+    ids = run_with_timeout(lambda: collectIds(pr))
+    run_with_timeout(lambda: collectIds(pr))
+
+    assert ids == ['1234567', '42', '7654321']
+    assert get_ticket_index(pr).ids(tickets_only=True) == ['1234567', '7654321']
+    assert get_ticket_index(pr).sources('1234567') == ['title', 'b']
+    assert pr.reads['commits'] == 1
+
+
+def test_ticket_pattern_needs_standalone_long_ids():
+    index = TicketIdIndex()
+    index.scan_text('title', "fix #123456 and #12 (#7654321) ##1234567 #1234567x #2345678")
+
+    assert index.ids(tickets_only=True) == ['123456', '2345678']
+    assert index.ids() == ['123456', '12', '7654321', '1234567', '2345678']
+
+
+def test_index_round_trips_through_store(tmp_path):
+    store = TicketIdStore(str(tmp_path))
+    index = TicketIdIndex('abc')
+    index.scan_commit('abc', "Fix #1234567")
+    store.put('owner/repo', 1, index)
+
+    cached = store.get('owner/repo', 1)
+
+    assert cached.head_sha == 'abc'
+    assert cached.ids() == ['1234567']
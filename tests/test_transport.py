@@ -0,0 +1,28 @@
+import pytest
+
+import libs.transport
+from libs.transport import CODEBEAMER, GITHUB, GITHUB_GRAPHQL, JENKINS, EtagCachingAdapter, get_session
+
+
+@pytest.fixture(autouse=True)
+def sessions(monkeypatch):
+    monkeypatch.setattr(libs.transport, '_sessions', {})
+
+
+def test_one_session_is_shared_per_service():
+    assert get_session(JENKINS) is get_session(JENKINS)
+    assert get_session(JENKINS) is not get_session(CODEBEAMER)
+
+
+def test_sessions_keep_connections_alive_with_default_timeouts():
+    session = get_session(CODEBEAMER)
+
+    assert session.headers['Connection'] == 'keep-alive'
+    assert session.timeout == (libs.transport.connect_timeout, libs.transport.read_timeout)
+    assert session.governor is None
+
+
+def test_github_sessions_are_governed():
+    assert isinstance(get_session(GITHUB).get_adapter('https://api.github.com'), EtagCachingAdapter)
+    assert get_session(GITHUB_GRAPHQL).resource == 'graphql'
+    assert get_session(GITHUB).governor is get_session(GITHUB_GRAPHQL).governor
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from github import Github
+
+from libs.utils import *
+from libs.codebeamer import get_codebeamer_client
+from libs.github_graphql import GithubGraphQl
+from libs.state import state_path
+from libs.ticket_actions import assign_reviewers, label_pull_request, link_tickets
+from libs.ticket_ids import BODY, TITLE, TicketIdIndex, get_ticket_id_store
+
+
+log_level = os.environ.get('INPUT_LOG_LEVEL', 'INFO')
+logging.basicConfig(format='ACTION: %(message)s', level=log_level)
+
+output_file = os.environ.get('GITHUB_OUTPUT')
+checkpoint_file = os.environ.get('INPUT_CHECKPOINT_FILE') or state_path('ticket-batch-checkpoint.json')
+max_workers = int(os.environ.get('INPUT_MAX_WORKERS') or 4)
+
+ACTIONS = ('ticketlinker', 'autolabel', 'autoassign')
+
+
+def main():
+    access_token = os.environ.get("INPUT_ACCESS_TOKEN")
+    codebeamer_user = os.environ.get("INPUT_CODEBEAMER_USER")
+    codebeamer_password = os.environ.get("INPUT_CODEBEAMER_PASSWORD")
+    repository = os.environ.get("INPUT_REPOSITORY") or os.environ.get("GITHUB_REPOSITORY")
+    actions = [action.strip() for action in os.environ.get("INPUT_ACTIONS", ",".join(ACTIONS)).split(",") if action.strip()]
+
+    if not access_token:
+        raise Exception("access_token parameters must be set")
+
+    if not (codebeamer_user and codebeamer_password):
+        raise Exception("codebeamer_user and codebeamer_password parameters must be set")
+
+    if unknown := set(actions) - set(ACTIONS):
+        raise Exception(f"Unknown actions: {', '.join(sorted(unknown))}")
+
+    g = Github(access_token)
+    gql = GithubGraphQl(access_token)
+    cbAuth = (codebeamer_user, codebeamer_password)
+    repo = g.get_repo(repository)
+    checkpoint = Checkpoint(checkpoint_file)
+    report = run_batch(g, gql, repo, cbAuth, actions, checkpoint, max_workers)
+
+    logging.info(f"Batch report: {json.dumps(report)}")
+    logging.info(f"GitHub rate limit budget: {get_github_budget()}")
+    if output_file:
+        with open(output_file, 'a') as f:
+            print(f"report={json.dumps(report)}", file=f)
+
+    if report['failed']:
+        raise Exception(f"Pull requests failed: {report['failed']}, re-run to continue from the checkpoint")
+
+
+def run_batch(g, gql, repo, cbAuth, actions, checkpoint, max_workers):
+    owner, repository_name = repo.full_name.split('/')
+
+    pull_requests = gql.get_open_pull_requests(owner, repository_name)
+    pending = [pull_request for pull_request in pull_requests if not checkpoint.is_done(pull_request)]
+    logging.info(f"{len(pending)} of {len(pull_requests)} open pull requests are processed, the rest is done according to {checkpoint.path}")
+
+    # Every unique ticket is resolved once, before the pull requests are processed
+    indexes = {pull_request['number']: ticket_index(repo.full_name, pull_request) for pull_request in pending}
+    ids = {id for index in indexes.values() if index for id in index.ids()}
+    logging.info(f"Resolving {len(ids)} unique ticket ids")
+    get_codebeamer_client(cbAuth).get_items(ids)
+
+    team_resolver = TeamResolver(getOrganization(g))
+
+    def process(pull_request):
+        number = pull_request['number']
+        try:
+            context = get_pull_request_context(g, repo.full_name, number)
+            context.prime('repo', repo)
+            if indexes[number]:
+                context.prime('ticket_ids', indexes[number])
+            pr = context.pr
+
+            if 'ticketlinker' in actions:
+                link_tickets(pr, cbAuth)
+            if 'autolabel' in actions:
+                label_pull_request(pr, cbAuth)
+            if 'autoassign' in actions:
+                assign_reviewers(pr, cbAuth, team_resolver)
+        except Exception as e:
+            logging.warning(f"Pull request #{number} cannot be processed: {e}")
+            return False
+
+        checkpoint.mark(pull_request)
+        return True
+
+    # GitHub writes of the workers are paced by the shared rate limiter
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip((pull_request['number'] for pull_request in pending), executor.map(process, pending)))
+
+    return {
+        'processed': sum(results.values()),
+        'skipped': len(pull_requests) - len(pending),
+        'failed': sorted(number for number, succeeded in results.items() if not succeeded)
+    }
+
+
+def ticket_index(repo_name, pull_request):
+    # Long PRs are scanned on their own when they are processed
+    if not pull_request['complete']:
+        return None
+
+    index = TicketIdIndex(pull_request['head_sha'])
+    for commit in pull_request['commits']:
+        index.scan_commit(commit['sha'], commit['message'])
+    get_ticket_id_store().put(repo_name, pull_request['number'], index)
+
+    index.scan_text(TITLE, pull_request['title'])
+    index.scan_text(BODY, pull_request['body'])
+    return index
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as f:
+                self.done = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def is_done(self, pull_request):
+        # A PR pushed since it was processed is processed again
+        return self.done.get(str(pull_request['number'])) == pull_request['head_sha']
+
+    def mark(self, pull_request):
+        with self._lock:
+            self.done[str(pull_request['number'])] = pull_request['head_sha']
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.done, f)
+            os.replace(tmp_path, self.path)
+
+
+if __name__ == "__main__":
+    main()